@@ -1,44 +1,96 @@
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import requests
+from cachetools import TTLCache
+import hashlib
+import httpx
 import os
 from typing import Optional
 
+from metrics import HTTPX_EVENT_HOOKS
+
 # Security
 security = HTTPBearer()
 
 # Configuration
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
-ADMIN_EMAILS = os.getenv("ADMIN_EMAILS", "admin@seneca.ca,admin@example.com").split(",")
+ADMIN_EMAILS = frozenset(
+    email.strip().lower()
+    for email in os.getenv("ADMIN_EMAILS", "admin@seneca.ca,admin@example.com").split(",")
+)
 SERVICE_AUTH_TOKEN = os.getenv("SERVICE_AUTH_TOKEN", "order-service")
 
+# Shared HTTP client so user-service calls reuse keep-alive connections
+# (closed from the application lifespan in main.py)
+http_client = httpx.AsyncClient(
+    base_url=USER_SERVICE_URL,
+    timeout=5.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+    event_hooks=HTTPX_EVENT_HOOKS,
+)
+
+# Recently verified tokens, keyed by a digest of the token (raw tokens are never stored)
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+_token_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL)
+_INVALID_TOKEN = object()
+
+def _token_key(token: str) -> str:
+    """Hash a bearer token for use as a cache key."""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+def _unauthorized() -> HTTPException:
+    """Build the 401 raised for rejected tokens."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 async def verify_service_token(request: Request) -> bool:
     """Verify service-to-service authentication."""
     service_auth = request.headers.get("X-Service-Auth")
     return service_auth == SERVICE_AUTH_TOKEN
 
-async def verify_user_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify user token by calling user service."""
+async def verify_user_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verify user token by calling user service.
+    
+    The verified user is stored on request.state.user, so anything else in
+    the same request reads it from there instead of verifying again.
+    """
+    user_data = getattr(request.state, "user", None)
+    if user_data is not None:
+        return user_data
+    
     token = credentials.credentials
+    cache_key = _token_key(token)
+    
+    cached = _token_cache.get(cache_key)
+    if cached is _INVALID_TOKEN:
+        raise _unauthorized()
+    if cached is not None:
+        request.state.user = cached
+        return cached
     
     try:
         # Call user service to verify token
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{USER_SERVICE_URL}/me", headers=headers, timeout=5)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except requests.RequestException:
+        response = await http_client.get("/me", headers=headers)
+    except httpx.RequestError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="User service unavailable"
         )
+    
+    if response.status_code == 200:
+        user_data = response.json()
+        _token_cache[cache_key] = user_data
+        request.state.user = user_data
+        return user_data
+    
+    if response.status_code == 401:
+        # Remember rejected tokens briefly so retries short-circuit too
+        _token_cache[cache_key] = _INVALID_TOKEN
+    raise _unauthorized()
 
 async def get_current_user(user_data: dict = Depends(verify_user_token)) -> dict:
     """Get current authenticated user."""
@@ -46,7 +98,7 @@ async def get_current_user(user_data: dict = Depends(verify_user_token)) -> dict
 
 async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
     """Verify that current user is an admin."""
-    user_email = current_user.get("email", "")
+    user_email = (current_user.get("email") or "").lower()
     
     if user_email not in ADMIN_EMAILS:
         raise HTTPException(
@@ -0,0 +1,161 @@
+"""
+Response cache for catalog data that is expensive to recompute.
+Uses Redis when REDIS_URL is set so every replica shares entries, and an
+in-process TTL cache otherwise. Entries are stored as (fresh_until, value)
+so callers can opt into serving stale values while a refresh runs.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import TLRUCache
+import orjson
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+def make_key(namespace: str, *parts: Any) -> str:
+    """Build a compact cache key from a namespace and its parameters."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f"{namespace}:{digest}"
+
+class ResponseCache:
+    """JSON value cache with per-key TTLs and single-flight population."""
+
+    def __init__(self, redis_url: Optional[str] = None, maxsize: int = 1024):
+        self.redis = redis.from_url(redis_url) if redis_url else None
+        # Local entries are stored as (ttl, value) so each key expires on its own TTL
+        self._local = TLRUCache(maxsize=maxsize, ttu=lambda _key, entry, now: now + entry[0])
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._versions: Dict[str, int] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def close(self):
+        """Close the Redis connection pool, if any."""
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def _read(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Return the stored (fresh_until, value) entry for a key, if any."""
+        if self.redis is None:
+            entry = self._local.get(key)
+            return entry[1] if entry is not None else None
+
+        try:
+            raw = await self.redis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache read failed for '{key}': {str(e)}")
+            return None
+        return tuple(orjson.loads(raw)) if raw is not None else None
+
+    async def _write(self, key: str, value: Any, ttl: int, stale_ttl: int = 0):
+        """Store a value that is fresh for ttl seconds and kept stale_ttl seconds longer."""
+        entry = (time.time() + ttl, value)
+        lifetime = ttl + stale_ttl
+        if self.redis is None:
+            self._local[key] = (lifetime, entry)
+            return
+
+        try:
+            await self.redis.setex(key, lifetime, orjson.dumps(entry))
+        except redis.RedisError as e:
+            logger.warning(f"Cache write failed for '{key}': {str(e)}")
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (hit, value) for a key."""
+        entry = await self._read(key)
+        return (True, entry[1]) if entry is not None else (False, None)
+
+    async def set(self, key: str, value: Any, ttl: int):
+        """Store a JSON-serializable value for ttl seconds."""
+        await self._write(key, value, ttl)
+
+    async def get_version(self, name: str) -> int:
+        """
+        Return the current value of a version counter.
+
+        Including the version in cache keys lets a whole family of entries be
+        invalidated with one bump_version() instead of scanning for keys.
+        """
+        if self.redis is None:
+            return self._versions.get(name, 0)
+
+        try:
+            raw = await self.redis.get(name)
+        except redis.RedisError as e:
+            logger.warning(f"Cache version read failed for '{name}': {str(e)}")
+            return -1
+        return int(raw) if raw is not None else 0
+
+    async def bump_version(self, name: str):
+        """Advance a version counter, orphaning every key built from the old value."""
+        if self.redis is None:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return
+
+        try:
+            await self.redis.incr(name)
+        except redis.RedisError as e:
+            logger.warning(f"Cache version bump failed for '{name}': {str(e)}")
+
+    async def get_or_set(
+        self,
+        key: str,
+        ttl: int,
+        factory: Callable[[], Awaitable[Any]],
+        stale_ttl: int = 0
+    ) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        Concurrent misses for the same key wait on a single factory call
+        instead of each recomputing the value. With stale_ttl, an expired
+        value is still returned for up to stale_ttl seconds while the factory
+        refreshes it in the background; the factory must then not depend on
+        request-scoped resources.
+        """
+        entry = await self._read(key)
+        if entry is not None:
+            fresh_until, value = entry
+            if fresh_until <= time.time():
+                self._schedule_refresh(key, ttl, factory, stale_ttl)
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                entry = await self._read(key)
+                if entry is not None:
+                    return entry[1]
+
+                value = await factory()
+                await self._write(key, value, ttl, stale_ttl)
+                return value
+        finally:
+            if not lock.locked():
+                self._locks.pop(key, None)
+
+    def _schedule_refresh(self, key: str, ttl: int, factory: Callable[[], Awaitable[Any]], stale_ttl: int):
+        """Recompute a stale entry in the background, at most once at a time per key."""
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._write(key, await factory(), ttl, stale_ttl)
+            except Exception as e:
+                # Keep serving the stale value; the next hit retries
+                logger.warning(f"Background refresh failed for '{key}': {str(e)}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+# Global instance
+response_cache = ResponseCache(REDIS_URL)
@@ -1,19 +1,58 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from database import Book
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, func, lambda_stmt, select
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import Book, isbn_normalized
 import schemas
-from typing import List, Optional
+from cache import make_key, response_cache
+from typing import List, Optional, Sequence
 
-def get_book_by_id(db: Session, book_id: int) -> Optional[Book]:
+BOOK_COLUMNS = tuple(Book.__table__.c.keys())
+_ISBN_STRIP = str.maketrans("", "", "- ")
+_LIKE_ESCAPE = str.maketrans({"\\": "\\\\", "%": "\\%", "_": "\\_"})
+
+def _contains_pattern(value: str) -> str:
+    """Build an ILIKE substring pattern, treating % and _ in value literally."""
+    return f"%{value.translate(_LIKE_ESCAPE)}%"
+
+# Cached listings are keyed by a version counter that every book write bumps
+CATALOG_VERSION_KEY = "catalog:version"
+BOOKS_CACHE_TTL = 60
+LOOKUP_CACHE_TTL = 600
+
+async def invalidate_catalog_cache() -> None:
+    """Invalidate cached book listings, categories and authors."""
+    await response_cache.bump_version(CATALOG_VERSION_KEY)
+
+async def get_book_by_id(db: AsyncSession, book_id: int) -> Optional[Book]:
     """Get book by ID."""
-    return db.query(Book).filter(Book.id == book_id).first()
+    return await db.get(Book, book_id)
+
+async def get_books_by_ids(db: AsyncSession, book_ids: Sequence[int]) -> List[Book]:
+    """Get the books with the given IDs in one query (missing IDs are left out)."""
+    result = await db.execute(select(Book).where(Book.id.in_(set(book_ids))))
+    return list(result.scalars())
+
+def normalize_isbn(isbn: str) -> str:
+    """Strip hyphens and spaces from an ISBN."""
+    return isbn.translate(_ISBN_STRIP)
 
-def get_book_by_isbn(db: Session, isbn: str) -> Optional[Book]:
-    """Get book by ISBN."""
-    return db.query(Book).filter(Book.isbn == isbn).first()
+async def get_book_by_isbn(db: AsyncSession, isbn: str) -> Optional[Book]:
+    """Get book by ISBN, ignoring hyphens and spaces."""
+    result = await db.execute(select(Book).where(isbn_normalized == normalize_isbn(isbn)).limit(1))
+    return result.scalars().first()
 
-def get_books(
-    db: Session, 
+async def get_existing_isbns(db: AsyncSession, isbns: List[str]) -> set[str]:
+    """Return which of the given ISBNs are already in the catalog (normalized)."""
+    if not isbns:
+        return set()
+    normalized = {normalize_isbn(isbn) for isbn in isbns}
+    result = await db.execute(select(isbn_normalized).where(isbn_normalized.in_(normalized)))
+    return set(result.scalars())
+
+async def get_books(
+    db: AsyncSession, 
     skip: int = 0, 
     limit: int = 100,
     search: Optional[str] = None,
@@ -21,99 +60,196 @@ def get_books(
     author: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    available_only: bool = True
-) -> tuple[List[Book], int]:
-    """Get books with optional filtering and pagination."""
-    query = db.query(Book)
+    available_only: bool = True,
+    fields: Optional[Sequence[str]] = None
+) -> tuple[List[dict], int]:
+    """Get books with optional filtering and pagination.
+    
+    Rows are read through Core and returned as plain dicts, skipping ORM
+    hydration since the listing is read-only. fields limits the columns
+    selected (id is always included). Pages are cached per filter
+    combination until the next book write.
+    """
+    columns = BOOK_COLUMNS if fields is None else ("id", *(f for f in BOOK_COLUMNS if f in fields and f != "id"))
+    version = await response_cache.get_version(CATALOG_VERSION_KEY)
+    key = make_key(
+        "books", version, skip, limit, search, category, author, min_price, max_price, available_only, columns
+    )
+    books, total = await response_cache.get_or_set(
+        key,
+        BOOKS_CACHE_TTL,
+        lambda: _query_books(db, skip, limit, search, category, author, min_price, max_price, available_only, columns)
+    )
+    return books, total
+
+async def _query_books(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    search: Optional[str],
+    category: Optional[str],
+    author: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    available_only: bool,
+    columns: Sequence[str] = BOOK_COLUMNS
+) -> tuple[List[dict], int]:
+    """Run the filtered, paginated book query."""
+    selected = tuple(Book.__table__.c[column] for column in columns)
+    # track_on keys the cached SQL on the projected columns
+    stmt = lambda_stmt(lambda: select(*selected, func.count().over().label("_total")), track_on=[selected])
+    stmt = _filter_books(stmt, search, category, author, min_price, max_price, available_only)
+    
+    # Total count comes back with the page via the window function; order by
+    # primary key so OFFSET paging is stable across requests
+    stmt += lambda s: s.order_by(Book.id).offset(skip).limit(limit)
+    rows = (await db.execute(stmt)).mappings().all()
+    if rows:
+        total = rows[0]["_total"]
+        return [{key: row[key] for key in columns} for row in rows], total
+    
+    # Page past the end: fall back to a plain count for the total
+    if skip:
+        count_stmt = lambda_stmt(lambda: select(func.count()).select_from(Book))
+        count_stmt = _filter_books(count_stmt, search, category, author, min_price, max_price, available_only)
+        return [], (await db.execute(count_stmt)).scalar_one()
     
-    # Apply filters
+    return [], 0
+
+def _filter_books(
+    stmt: StatementLambdaElement,
+    search: Optional[str],
+    category: Optional[str],
+    author: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    available_only: bool
+) -> StatementLambdaElement:
+    """Apply the listing filters to a lambda statement.
+    
+    Each filter is a separate lambda, so SQLAlchemy compiles the SQL once per
+    combination of filters in use and only binds the values on later calls.
+    """
     if available_only:
-        query = query.filter(Book.available == True)
+        stmt += lambda s: s.where(Book.available == True)
     
     if search:
-        search_filter = or_(
-            Book.title.ilike(f"%{search}%"),
-            Book.author.ilike(f"%{search}%"),
-            Book.description.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
+        pattern = _contains_pattern(search)
+        stmt += lambda s: s.where(or_(
+            Book.title.ilike(pattern, escape="\\"),
+            Book.author.ilike(pattern, escape="\\"),
+            Book.description.ilike(pattern, escape="\\")
+        ))
     
     if category:
-        query = query.filter(Book.category.ilike(f"%{category}%"))
+        category_pattern = _contains_pattern(category)
+        stmt += lambda s: s.where(Book.category.ilike(category_pattern, escape="\\"))
     
     if author:
-        query = query.filter(Book.author.ilike(f"%{author}%"))
+        author_pattern = _contains_pattern(author)
+        stmt += lambda s: s.where(Book.author.ilike(author_pattern, escape="\\"))
     
     if min_price is not None:
-        query = query.filter(Book.price >= min_price)
+        stmt += lambda s: s.where(Book.price >= min_price)
     
     if max_price is not None:
-        query = query.filter(Book.price <= max_price)
-    
-    # Get total count before pagination
-    total = query.count()
+        stmt += lambda s: s.where(Book.price <= max_price)
     
-    # Apply pagination
-    books = query.offset(skip).limit(limit).all()
-    
-    return books, total
+    return stmt
 
-def create_book(db: Session, book: schemas.BookCreate) -> Book:
+async def create_book(db: AsyncSession, book: schemas.BookCreate) -> Book:
     """Create a new book."""
-    db_book = Book(**book.dict())
+    db_book = Book(**book.model_dump())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    await invalidate_catalog_cache()
     return db_book
 
-def update_book(db: Session, book_id: int, book_update: schemas.BookUpdate) -> Optional[Book]:
+async def bulk_create_books(db: AsyncSession, books: List[schemas.BookCreate]) -> List[dict]:
+    """Insert books in one statement, skipping any whose ISBN already exists."""
+    if not books:
+        return []
+    
+    insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = (
+        insert(Book)
+        .values([book.model_dump() for book in books])
+        .on_conflict_do_nothing(index_elements=["isbn"])
+        .returning(*Book.__table__.c)
+    )
+    created_books = [dict(row) for row in (await db.execute(stmt)).mappings()]
+    await db.commit()
+    
+    if created_books:
+        await invalidate_catalog_cache()
+    return created_books
+
+async def update_book(db: AsyncSession, book_id: int, book_update: schemas.BookUpdate) -> Optional[Book]:
     """Update an existing book."""
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     if not db_book:
         return None
     
-    update_data = book_update.dict(exclude_unset=True)
+    update_data = book_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_book, field, value)
     
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    await invalidate_catalog_cache()
     return db_book
 
-def delete_book(db: Session, book_id: int) -> bool:
+async def delete_book(db: AsyncSession, book_id: int) -> bool:
     """Delete a book."""
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     if not db_book:
         return False
     
-    db.delete(db_book)
-    db.commit()
+    await db.delete(db_book)
+    await db.commit()
+    await invalidate_catalog_cache()
     return True
 
-def get_categories(db: Session) -> List[str]:
+async def get_categories(db: AsyncSession) -> List[str]:
     """Get all unique categories."""
-    categories = db.query(Book.category).filter(Book.category.isnot(None)).distinct().all()
-    return [cat[0] for cat in categories if cat[0]]
+    version = await response_cache.get_version(CATALOG_VERSION_KEY)
+    return await response_cache.get_or_set(
+        make_key("categories", version), LOOKUP_CACHE_TTL, lambda: _query_categories(db)
+    )
+
+async def _query_categories(db: AsyncSession) -> List[str]:
+    """Run the distinct category query."""
+    categories = await db.execute(
+        select(Book.category).where(Book.category.isnot(None), Book.category != "").distinct()
+    )
+    return list(categories.scalars())
 
-def get_authors(db: Session) -> List[str]:
+async def get_authors(db: AsyncSession) -> List[str]:
     """Get all unique authors."""
-    authors = db.query(Book.author).distinct().all()
-    return [author[0] for author in authors]
+    version = await response_cache.get_version(CATALOG_VERSION_KEY)
+    return await response_cache.get_or_set(
+        make_key("authors", version), LOOKUP_CACHE_TTL, lambda: _query_authors(db)
+    )
 
-def get_books_by_source(db: Session, source: str, skip: int = 0, limit: int = 100) -> tuple[List[Book], int]:
+async def _query_authors(db: AsyncSession) -> List[str]:
+    """Run the distinct author query."""
+    authors = await db.execute(select(Book.author).distinct())
+    return list(authors.scalars())
+
+async def get_books_by_source(db: AsyncSession, source: str, skip: int = 0, limit: int = 100) -> tuple[List[Book], int]:
     """Get books by data source (local, open_library, etc.)."""
-    query = db.query(Book).filter(Book.source == source)
-    total = query.count()
-    books = query.offset(skip).limit(limit).all()
-    return books, total
+    query = select(Book).where(Book.source == source)
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+    books = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
+    return list(books), total
 
-def get_book_by_external_key(db: Session, external_key: str) -> Optional[Book]:
+async def get_book_by_external_key(db: AsyncSession, external_key: str) -> Optional[Book]:
     """Get book by external API key."""
-    return db.query(Book).filter(Book.external_key == external_key).first()
+    result = await db.execute(select(Book).where(Book.external_key == external_key).limit(1))
+    return result.scalars().first()
 
-def update_book_stock(db: Session, book_id: int, quantity_change: int) -> Optional[Book]:
+async def update_book_stock(db: AsyncSession, book_id: int, quantity_change: int) -> Optional[Book]:
     """Update book stock quantity (can be positive or negative)."""
-    db_book = db.query(Book).filter(Book.id == book_id).first()
+    db_book = await db.get(Book, book_id)
     if not db_book:
         return None
     
@@ -129,6 +265,6 @@ def update_book_stock(db: Session, book_id: int, quantity_change: int) -> Option
     # Update availability based on stock
     db_book.available = new_stock > 0
     
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    await invalidate_catalog_cache()
     return db_book
@@ -1,14 +1,69 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import event, literal, DDL, Index, Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.sql import func
 import os
+import time
+
+from metrics import record_downstream_time
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./catalog.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def to_async_url(url: str) -> str:
+    """Point a plain database URL at its asyncio driver (aiosqlite / asyncpg)."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith(("postgresql:", "postgres:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_async_engine(to_async_url(DATABASE_URL), query_cache_size=1200)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Let readers run alongside the writer and cut fsyncs per commit."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.close()
+else:
+    # Async engines default to AsyncAdaptedQueuePool
+    engine = create_async_engine(
+        to_async_url(DATABASE_URL),
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        # Room for every /books filter combination alongside the other statements
+        query_cache_size=1200,
+    )
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+def _record_query_time(conn):
+    """Count query time as downstream time for the endpoint overhead metric."""
+    start = conn.info.pop("query_start", None)
+    if start is not None:
+        record_downstream_time(time.perf_counter() - start)
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    _record_query_time(conn)
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def stop_failed_query_timer(exception_context):
+    # after_cursor_execute does not fire for a statement that raises
+    if exception_context.connection is not None:
+        _record_query_time(exception_context.connection)
+
+# Objects stay loaded after commit so handlers can serialize them without a reload
+AsyncSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -30,16 +85,57 @@ class Book(Base):
     cover_url = Column(String, nullable=True)  # Book cover image URL
     source = Column(String, default="local", nullable=True)  # Data source: local, open_library, etc.
     external_key = Column(String, nullable=True)  # External API key/identifier
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps are stamped by the database clock rather than computed in Python
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Fetch server-generated timestamps in the INSERT/UPDATE itself (RETURNING)
+    # rather than with a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Default listing filter: available_only=True plus an optional category
+        Index("ix_books_available_category", "available", "category"),
+        # available_only=True with a min/max price range: both are index
+        # conditions, and PostgreSQL can BitmapAnd it with the category
+        # trigram index for the storefront's category + price filter
+        Index("ix_books_available_price", "available", "price"),
+    )
+
+# ISBN with hyphens and spaces removed, so "978-1234567890" and
+# "9781234567890" match; indexed so the lookup stays an index seek
+# (literal separators keep the query expression identical to the indexed one)
+isbn_normalized = func.replace(
+    func.replace(Book.isbn, literal("-", literal_execute=True), literal("", literal_execute=True)),
+    literal(" ", literal_execute=True),
+    literal("", literal_execute=True),
+)
+Index("ix_books_isbn_normalized", isbn_normalized)
+
+# Trigram indexes let PostgreSQL serve the '%term%' ILIKE searches and the
+# category/author filters in crud.get_books from an index instead of a
+# sequential scan
+event.listen(
+    Book.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+for _column in ("title", "author", "description", "category"):
+    event.listen(
+        Book.__table__,
+        "after_create",
+        DDL(
+            f"CREATE INDEX IF NOT EXISTS ix_books_{_column}_trgm "
+            f"ON books USING gin ({_column} gin_trgm_ops)"
+        ).execute_if(dialect="postgresql"),
+    )
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+async def init_db():
+    """Create any missing tables (called once from the application lifespan)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,20 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Request
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, Body, Depends, HTTPException, status, Query, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 from typing import Optional, List
+from contextlib import asynccontextmanager
 import logging
+import orjson
+import os
 import time
 
 # Import our modules
-from database import get_db
-from auth import get_admin_user, get_current_user, verify_service_token
+from database import get_db, init_db
+from auth import get_admin_user, get_current_user, verify_service_token, verify_user_token
 import auth
 import crud
+from cache import response_cache
 import schemas
 from metrics import PrometheusMetrics
-from open_library_api import open_library_api
+from open_library_api import POPULAR_SUBJECTS, open_library_api
 
 # Configure logging
 logging.basicConfig(
@@ -26,10 +33,22 @@ logger = logging.getLogger("catalog-service")
 # Initialize Prometheus metrics
 metrics = PrometheusMetrics(app_name="catalog")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables on startup and release shared clients on shutdown."""
+    if os.getenv("AUTO_CREATE_TABLES", "1") == "1":
+        await init_db()
+    yield
+    await auth.http_client.aclose()
+    await open_library_api.close()
+    await response_cache.close()
+
 app = FastAPI(
     title="Catalog Service", 
     version="2.0.0", 
-    description="Book catalog and inventory management service"
+    description="Book catalog and inventory management service",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -41,64 +60,87 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    """Collect metrics for all requests."""
-    start_time = metrics.start_request()
-    
-    response = await call_next(request)
-    
-    # Calculate processing time
-    process_time = time.time() - start_time
-    metrics.end_request()
-    
-    # Record metrics
-    endpoint = request.url.path
-    metrics.record_request(request.method, endpoint, response.status_code, process_time)
-    
-    return response
+# Probe and scrape endpoints skip request metrics and logging
+UNINSTRUMENTED_PATHS = frozenset({"/", "/health", "/metrics"})
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all API requests with method, path, user, and response status."""
-    start_time = time.time()
-    
-    # Extract user info if available
-    user_info = "anonymous"
-    try:
-        if "authorization" in request.headers:
-            auth_header = request.headers["authorization"]
-            if auth_header.startswith("Bearer "):
-                # For catalog service, we'll just note "authenticated" without verifying
-                # since the actual verification happens in the auth middleware
-                user_info = "authenticated"
-    except Exception:
-        pass
-    
-    # Process request
-    response = await call_next(request)
+# Catalog activity counters, recorded by the middleware per (method, route template)
+ROUTE_COUNTERS = {
+    ("GET", "/books"): metrics.books_browsed,
+    ("GET", "/books/{book_id}"): metrics.books_viewed,
+    ("GET", "/books/external/subject/{subject}"): metrics.books_browsed,
+    ("GET", "/books/external/search"): metrics.catalog_search_queries,
+}
+
+class MetricsMiddleware:
+    """
+    Collect metrics for and log all API requests with method, path, user, and response status.
     
-    # Calculate processing time
-    process_time = time.time() - start_time
+    A plain ASGI middleware rather than @app.middleware("http"): the status
+    is read from the response start message, so the endpoint runs in the
+    same task without BaseHTTPMiddleware's extra task and body stream.
+    """
     
-    # Log the request
-    logger.info(
-        f"Method: {request.method} | "
-        f"Path: {request.url.path} | "
-        f"User: {user_info} | "
-        f"Status: {response.status_code} | "
-        f"Time: {process_time:.3f}s"
-    )
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in UNINSTRUMENTED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
+        start_time = metrics.start_request(headers.get("x-request-start"))
+        status_code = 500
+        
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Calculate processing time
+            process_time = time.perf_counter() - start_time
+            metrics.end_request()
+            
+            # Record metrics against the route template (e.g. /books/{book_id}) so
+            # label cardinality stays bounded by the number of routes
+            method = scope["method"]
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            metrics.record_request(method, endpoint, status_code, process_time)
+            counter = ROUTE_COUNTERS.get((method, endpoint))
+            if counter is not None:
+                counter.inc()
+            
+            # Log the request
+            if logger.isEnabledFor(logging.INFO):
+                # For catalog service, we'll just note "authenticated" without verifying
+                # since the actual verification happens in the auth dependencies
+                user_info = "authenticated" if headers.get("authorization", "").startswith("Bearer ") else "anonymous"
+                logger.info(
+                    f"Method: {method} | "
+                    f"Path: {scope['path']} | "
+                    f"User: {user_info} | "
+                    f"Status: {status_code} | "
+                    f"Time: {process_time:.3f}s"
+                )
+
+app.add_middleware(MetricsMiddleware)
+
+# Probe responses never change, so their bodies are encoded once
+ROOT_BODY = orjson.dumps({"status": "healthy", "service": "catalog-service"})
+HEALTH_BODY = orjson.dumps({"status": "OK", "service": "catalog-service"})
 
 @app.get("/")
 async def health_check():
-    return {"status": "healthy", "service": "catalog-service"}
+    return Response(ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health():
-    return {"status": "OK", "service": "catalog-service"}
+    return Response(HEALTH_BODY, media_type="application/json")
 
 @app.get("/metrics")
 async def get_metrics():
@@ -122,20 +164,12 @@ async def search_external_books(
     Results include cover images, publication info, and metadata that can be imported
     to your local catalog.
     """
-    # Record external search metric
-    metrics.catalog_search_queries.inc()
-    
     try:
         logger.info(f"Searching external books with query: '{q}', limit: {limit}, offset: {offset}")
         result = await open_library_api.search_books(query=q, limit=limit, offset=offset)
         
-        return schemas.ExternalBookSearchResponse(
-            books=[schemas.ExternalBook(**book) for book in result["books"]],
-            total=result["total"],
-            offset=result["offset"],
-            limit=result["limit"],
-            query=q
-        )
+        # response_model validates the result once on the way out
+        return {**result, "query": q}
         
     except Exception as e:
         logger.error(f"Error searching external books: {str(e)}")
@@ -152,15 +186,7 @@ async def get_popular_subjects():
     Returns a curated list of popular book categories that can be used
     to browse books by subject using the /books/external/subject/{subject} endpoint.
     """
-    try:
-        subjects = await open_library_api.get_popular_subjects()
-        return subjects
-    except Exception as e:
-        logger.error(f"Error getting popular subjects: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to get popular subjects"
-        )
+    return POPULAR_SUBJECTS
 
 @app.get("/books/external/subject/{subject}", response_model=schemas.ExternalBookSearchResponse)
 async def get_books_by_subject(
@@ -174,20 +200,11 @@ async def get_books_by_subject(
     Browse books by popular categories like 'science_fiction', 'history', 'romance', etc.
     Use /books/external/subjects to get a list of available categories.
     """
-    # Record external browsing metric
-    metrics.books_browsed.inc()
-    
     try:
         logger.info(f"Getting books by subject: '{subject}', limit: {limit}, offset: {offset}")
         result = await open_library_api.get_books_by_subject(subject=subject, limit=limit, offset=offset)
         
-        return schemas.ExternalBookSearchResponse(
-            books=[schemas.ExternalBook(**book) for book in result["books"]],
-            total=result["total"],
-            offset=result["offset"],
-            limit=result["limit"],
-            subject=result["subject"]
-        )
+        return result
         
     except Exception as e:
         logger.error(f"Error getting books by subject '{subject}': {str(e)}")
@@ -209,7 +226,7 @@ async def get_external_book_by_isbn(isbn: str):
         result = await open_library_api.get_book_by_isbn(isbn=isbn)
         
         if result:
-            return schemas.ExternalBook(**result)
+            return result
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -225,11 +242,71 @@ async def get_external_book_by_isbn(isbn: str):
             detail="Failed to get book details"
         )
 
+@app.post("/books/external/isbn/batch", response_model=List[Optional[schemas.ExternalBook]])
+async def get_external_books_by_isbn(
+    isbns: List[str] = Body(..., min_length=1, max_length=100, description="ISBNs to look up")
+):
+    """
+    Get book details for several ISBNs from Open Library in one call.
+    
+    Lookups run concurrently over a shared connection pool. Results are
+    returned in request order, with null for ISBNs that were not found.
+    """
+    logger.info(f"Getting {len(isbns)} external books by ISBN")
+    results = await open_library_api.get_many_by_isbn(isbns)
+    return [result or None for result in results]
+
+def book_from_import(import_data: schemas.ExternalBookImport) -> schemas.BookCreate:
+    """Map an external book plus local pricing/stock onto a catalog book."""
+    external_book = import_data.external_book
+    return schemas.BookCreate(
+        title=external_book.title,
+        author=external_book.author,
+        isbn=external_book.isbn,
+        description=external_book.description or f"A book by {external_book.author}",
+        category=import_data.category or (external_book.subjects[0] if external_book.subjects else "General"),
+        price=import_data.price,
+        rent_price=import_data.rent_price,
+        available=True,
+        stock_quantity=import_data.stock_quantity,
+        publication_year=external_book.publication_year,
+        publisher=external_book.publisher,
+        cover_url=external_book.cover_url,
+        source=external_book.source,
+        external_key=external_book.key
+    )
+
+async def create_books_skipping_existing(db: AsyncSession, books: List[schemas.BookCreate]) -> dict:
+    """
+    Create books in one insert, skipping ISBNs that already exist.
+    
+    Existing ISBNs (in the catalog or earlier in the same batch) are found
+    with one query. Returns the BookImportBatchResponse payload.
+    """
+    existing = await crud.get_existing_isbns(db, isbns=[book.isbn for book in books if book.isbn])
+    
+    to_create = []
+    skipped = []
+    for book in books:
+        if book.isbn:
+            normalized = crud.normalize_isbn(book.isbn)
+            if normalized in existing:
+                skipped.append(book.isbn)
+                continue
+            existing.add(normalized)
+        to_create.append(book)
+    
+    created_books = await crud.bulk_create_books(db=db, books=to_create)
+    created_isbns = {book["isbn"] for book in created_books}
+    # Rows dropped by the insert's ON CONFLICT were created concurrently
+    skipped.extend(book.isbn for book in to_create if book.isbn and book.isbn not in created_isbns)
+    return {"created": len(created_books), "skipped": skipped, "books": created_books}
+
 @app.post("/books/import", response_model=schemas.BookResponse)
 async def import_external_book(
     import_data: schemas.ExternalBookImport,
     current_user: dict = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Import an external book to the local catalog.
@@ -241,27 +318,12 @@ async def import_external_book(
         external_book = import_data.external_book
         
         # Create BookCreate object from external book data
-        book_data = schemas.BookCreate(
-            title=external_book.title,
-            author=external_book.author,
-            isbn=external_book.isbn,
-            description=external_book.description or f"A book by {external_book.author}",
-            category=import_data.category or (external_book.subjects[0] if external_book.subjects else "General"),
-            price=import_data.price,
-            rent_price=import_data.rent_price,
-            available=True,
-            stock_quantity=import_data.stock_quantity,
-            publication_year=external_book.publication_year,
-            publisher=external_book.publisher,
-            cover_url=external_book.cover_url,
-            source=external_book.source,
-            external_key=external_book.key
-        )
+        book_data = book_from_import(import_data)
         
         # Check if book already exists (by ISBN or title+author)
         existing_book = None
         if external_book.isbn:
-            existing_book = crud.get_book_by_isbn(db, isbn=external_book.isbn)
+            existing_book = await crud.get_book_by_isbn(db, isbn=external_book.isbn)
         
         if existing_book:
             raise HTTPException(
@@ -270,7 +332,7 @@ async def import_external_book(
             )
         
         # Create the book in local database
-        new_book = crud.create_book(db=db, book=book_data)
+        new_book = await crud.create_book(db=db, book=book_data)
         logger.info(f"Successfully imported book: {new_book.title} (ID: {new_book.id})")
         
         return new_book
@@ -284,11 +346,35 @@ async def import_external_book(
             detail="Failed to import book to catalog"
         )
 
+@app.post("/books/import/batch", response_model=schemas.BookImportBatchResponse)
+async def import_external_books(
+    imports: List[schemas.ExternalBookImport] = Body(..., min_length=1, max_length=500),
+    current_user: dict = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Import several external books to the local catalog at once.
+    
+    Books whose ISBN already exists in the catalog (or earlier in the same
+    batch) are skipped rather than failing the whole import.
+    """
+    try:
+        result = await create_books_skipping_existing(db, [book_from_import(import_data) for import_data in imports])
+        logger.info(f"Batch import created {result['created']} books, skipped {len(result['skipped'])}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error importing external books: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to import books to catalog"
+        )
+
 # =============================================================================
 # LOCAL CATALOG ENDPOINTS
 # =============================================================================
 
-@app.get("/books", response_model=schemas.BookListResponse)
+@app.get("/books", response_model=schemas.PartialBookListResponse)
 async def get_books(
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
@@ -298,15 +384,28 @@ async def get_books(
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
     available_only: bool = Query(True, description="Show only available books"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated book fields to return (id is always included)"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get list of books with optional filtering and pagination."""
-    # Record book browsing metric
-    metrics.books_browsed.inc()
+    """
+    Get list of books with optional filtering and pagination.
     
+    With fields= each book holds only the requested fields and its id, so
+    the documented item schema has every field optional.
+    """
     skip = (page - 1) * size
     
-    books, total = crud.get_books(
+    selected_fields = None
+    if fields:
+        selected_fields = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = selected_fields.difference(crud.BOOK_COLUMNS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+    
+    books, total = await crud.get_books(
         db=db,
         skip=skip,
         limit=size,
@@ -315,23 +414,37 @@ async def get_books(
         author=author,
         min_price=min_price,
         max_price=max_price,
-        available_only=available_only
+        available_only=available_only,
+        fields=selected_fields
     )
     
-    return schemas.BookListResponse(
-        books=books,
-        total=total,
-        page=page,
-        size=size
-    )
+    # Rows come straight from our own table, so serialize them directly
+    # instead of re-validating each one against PartialBookListResponse
+    return ORJSONResponse(content={
+        "books": books,
+        "total": total,
+        "page": page,
+        "size": size
+    })
+
+@app.get("/books/batch", response_model=List[Optional[schemas.BookResponse]])
+async def get_books_batch(
+    ids: List[int] = Query(..., min_length=1, max_length=100, description="Book IDs to look up"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get several books by ID in one call.
+    
+    Results are returned in request order, with null for IDs that do not
+    exist, so callers can replace a loop of GET /books/{book_id}.
+    """
+    books = {book.id: book for book in await crud.get_books_by_ids(db, book_ids=ids)}
+    return [books.get(book_id) for book_id in ids]
 
 @app.get("/books/{book_id}", response_model=schemas.BookResponse)
-async def get_book(book_id: int, db: Session = Depends(get_db)):
+async def get_book(book_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific book by ID."""
-    # Record book view metric
-    metrics.books_viewed.inc()
-    
-    book = crud.get_book_by_id(db, book_id=book_id)
+    book = await crud.get_book_by_id(db, book_id=book_id)
     if book is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -342,28 +455,44 @@ async def get_book(book_id: int, db: Session = Depends(get_db)):
 @app.post("/books", response_model=schemas.BookResponse)
 async def create_book(
     book: schemas.BookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: dict = Depends(get_admin_user)
 ):
     """Create a new book (admin only)."""
     # Check if book with same ISBN already exists
-    if book.isbn and crud.get_book_by_isbn(db, isbn=book.isbn):
+    if book.isbn and await crud.get_book_by_isbn(db, isbn=book.isbn):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Book with this ISBN already exists"
         )
     
-    return crud.create_book(db=db, book=book)
+    return await crud.create_book(db=db, book=book)
+
+@app.post("/books/batch", response_model=schemas.BookImportBatchResponse)
+async def create_books(
+    books: List[schemas.BookCreate] = Body(..., min_length=1, max_length=500),
+    db: AsyncSession = Depends(get_db),
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Create several books at once (admin only).
+    
+    Books whose ISBN already exists are skipped instead of rejected, so bulk
+    loaders can re-send a dataset safely.
+    """
+    result = await create_books_skipping_existing(db, books)
+    logger.info(f"Batch create added {result['created']} books, skipped {len(result['skipped'])}")
+    return result
 
 @app.put("/books/{book_id}", response_model=schemas.BookResponse)
 async def update_book(
     book_id: int,
     book_update: schemas.BookUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: dict = Depends(get_admin_user)
 ):
     """Update a book (admin only)."""
-    book = crud.update_book(db, book_id=book_id, book_update=book_update)
+    book = await crud.update_book(db, book_id=book_id, book_update=book_update)
     if book is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -374,11 +503,11 @@ async def update_book(
 @app.delete("/books/{book_id}")
 async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: dict = Depends(get_admin_user)
 ):
     """Delete a book (admin only)."""
-    success = crud.delete_book(db, book_id=book_id)
+    success = await crud.delete_book(db, book_id=book_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -387,30 +516,30 @@ async def delete_book(
     return {"message": "Book deleted successfully"}
 
 @app.get("/categories")
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_db)):
     """Get all available book categories."""
-    categories = crud.get_categories(db)
-    return {"categories": categories}
+    categories = await crud.get_categories(db)
+    return ORJSONResponse({"categories": categories})
 
 @app.get("/authors")
-async def get_authors(db: Session = Depends(get_db)):
+async def get_authors(db: AsyncSession = Depends(get_db)):
     """Get all available authors."""
-    authors = crud.get_authors(db)
-    return {"authors": authors}
+    authors = await crud.get_authors(db)
+    return ORJSONResponse({"authors": authors})
 
 @app.put("/books/{book_id}/stock", response_model=schemas.BookResponse)
 async def update_book_stock(
     book_id: int,
     stock_update: schemas.BookStockUpdate,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update book stock quantity (admin or service auth required)."""
     # Check for service-to-service authentication first
     service_auth = request.headers.get("X-Service-Auth")
     if service_auth == "order-service":
         # Service authentication - proceed with stock update
-        book = crud.update_book_stock(db, book_id=book_id, quantity_change=stock_update.quantity_change)
+        book = await crud.update_book_stock(db, book_id=book_id, quantity_change=stock_update.quantity_change)
         if book is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -421,9 +550,6 @@ async def update_book_stock(
     else:
         # Regular admin authentication required
         try:
-            from auth import verify_user_token, get_current_user, get_admin_user
-            from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-            
             # Extract bearer token
             authorization = request.headers.get("Authorization")
             if not authorization or not authorization.startswith("Bearer "):
@@ -436,28 +562,28 @@ async def update_book_stock(
             credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
             
             # Verify admin user
-            user_data = await verify_user_token(credentials)
+            user_data = await verify_user_token(request, credentials)
             current_user = await get_current_user(user_data)
             admin_user = await get_admin_user(current_user)
-            
-            book = crud.update_book_stock(db, book_id=book_id, quantity_change=stock_update.quantity_change)
-            if book is None:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Book not found"
-                )
-            logger.info(f"Stock updated for book {book_id}: {stock_update.quantity_change} (Admin: {admin_user.get('email', 'unknown')})")
-            return book
-        except Exception as e:
+        except HTTPException:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Admin privileges required for manual stock updates"
             )
+        
+        book = await crud.update_book_stock(db, book_id=book_id, quantity_change=stock_update.quantity_change)
+        if book is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Book not found"
+            )
+        logger.info(f"Stock updated for book {book_id}: {stock_update.quantity_change} (Admin: {admin_user.get('email', 'unknown')})")
+        return book
 
 # Development endpoint to create sample data
 @app.post("/seed-data")
 async def seed_sample_data(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: dict = Depends(get_admin_user)
 ):
     """Create sample books for testing (admin only)."""
@@ -503,13 +629,14 @@ async def seed_sample_data(
         }
     ]
     
-    created_books = []
-    for book_data in sample_books:
-        # Check if book already exists
-        if not crud.get_book_by_isbn(db, isbn=book_data["isbn"]):
-            book = schemas.BookCreate(**book_data)
-            created_book = crud.create_book(db=db, book=book)
-            created_books.append(created_book)
+    # One lookup for already-seeded ISBNs (hyphen-insensitive), one insert for the rest
+    existing = await crud.get_existing_isbns(db, isbns=[book_data["isbn"] for book_data in sample_books])
+    books = [
+        schemas.BookCreate(**book_data)
+        for book_data in sample_books
+        if crud.normalize_isbn(book_data["isbn"]) not in existing
+    ]
+    created_books = await crud.bulk_create_books(db=db, books=books)
     
     return {
         "message": f"Created {len(created_books)} sample books",
@@ -1,6 +1,10 @@
 # Prometheus metrics for FastAPI services
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
 from fastapi import Response
+from contextvars import ContextVar
+from typing import Optional
+import math
+import os
 import time
 import logging
 
@@ -19,9 +23,21 @@ REQUEST_DURATION = Histogram(
     ['method', 'endpoint']
 )
 
+ENDPOINT_OVERHEAD = Histogram(
+    'endpoint_overhead_seconds',
+    'HTTP request time not spent waiting on the database or downstream services',
+    ['method', 'endpoint']
+)
+
+REQUEST_QUEUE_TIME = Histogram(
+    'http_request_queue_seconds',
+    'Time between the proxy receiving a request (X-Request-Start) and the service handling it'
+)
+
 ACTIVE_REQUESTS = Gauge(
     'http_requests_active',
-    'Currently active HTTP requests'
+    'Currently active HTTP requests',
+    multiprocess_mode='livesum'
 )
 
 ERROR_COUNT = Counter(
@@ -80,25 +96,139 @@ ORDERS_VALUE = Counter(
     ['order_type']
 )
 
+# Seconds the current request has spent waiting on the database and other
+# services. Holds a one-item list so time recorded in tasks spawned for the
+# request (which get a copy of the context) adds to the same total.
+_downstream_time: ContextVar[Optional[list]] = ContextVar("downstream_time", default=None)
+
+def record_downstream_time(seconds: float):
+    """Add time spent in a database or downstream HTTP call to the current request."""
+    total = _downstream_time.get()
+    if total is not None:
+        total[0] += seconds
+
+async def _mark_http_start(request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+async def _record_http_time(response):
+    start = response.request.extensions.get("metrics_start")
+    if start is not None:
+        record_downstream_time(time.perf_counter() - start)
+
+# event_hooks for httpx.AsyncClient instances whose calls count as downstream time
+HTTPX_EVENT_HOOKS = {"request": [_mark_http_start], "response": [_record_http_time]}
+
+def _parse_request_start(header: str) -> Optional[float]:
+    """Parse an X-Request-Start header ("t=<epoch>" in s, ms or us) into epoch seconds."""
+    try:
+        value = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    # The header is client-controlled: inf, nan and negatives are not times
+    if not (math.isfinite(value) and value > 0):
+        return None
+    # Proxies disagree on the unit; scale anything past year ~5000 in seconds
+    # down from ns, us or ms, and give up on values still too large after that
+    for _ in range(3):
+        if value <= 1e11:
+            return value
+        value /= 1000
+    return value if value <= 1e11 else None
+
+
+class BufferedCounter:
+    """
+    Counter whose increments are summed locally and added to the underlying
+    Prometheus Counter when metrics are scraped, so hot paths skip the
+    client library's lock. Only for counters incremented from the event loop.
+    """
+    __slots__ = ("counter", "pending")
+    
+    def __init__(self, counter: Counter):
+        self.counter = counter
+        self.pending = 0
+    
+    def inc(self, amount: float = 1):
+        if MULTIPROCESS:
+            # A scrape only flushes the worker that answers it
+            self.counter.inc(amount)
+            return
+        self.pending += amount
+    
+    def flush(self):
+        """Add the pending increments to the Prometheus counter."""
+        pending, self.pending = self.pending, 0
+        if pending:
+            self.counter.inc(pending)
+
+
+# Set when several worker processes share one metrics directory
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def scrape_registry():
+    """
+    Registry to expose on /metrics.
+    
+    With several worker processes, set PROMETHEUS_MULTIPROC_DIR (an empty
+    directory shared by the workers) so a scrape sums every worker's samples
+    instead of reporting whichever worker happened to answer.
+    """
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
 
 class PrometheusMetrics:
     """Prometheus metrics collection for FastAPI applications."""
     
     def __init__(self, app_name: str):
         self.app_name = app_name
+        # Labelled children per (method, endpoint, status); endpoints are route
+        # templates, so this stays bounded by routes x methods x statuses
+        self._request_children = {}
+        self._books_browsed = BufferedCounter(BOOKS_BROWSED)
+        self._books_viewed = BufferedCounter(BOOKS_VIEWED)
+        self._catalog_search_queries = BufferedCounter(CATALOG_SEARCH_QUERIES)
+    
+    def _children(self, method: str, endpoint: str, status_code: int):
+        """Return (count, duration, overhead, errors) metric children for a label set."""
+        key = (method, endpoint, status_code)
+        children = self._request_children.get(key)
+        if children is None:
+            children = (
+                REQUEST_COUNT.labels(method, endpoint, status_code),
+                REQUEST_DURATION.labels(method, endpoint),
+                ENDPOINT_OVERHEAD.labels(method, endpoint),
+                ERROR_COUNT.labels(method, endpoint, status_code) if status_code >= 400 else None,
+            )
+            self._request_children[key] = children
+        return children
         
     def record_request(self, method: str, endpoint: str, status_code: int, duration: float):
         """Record a completed HTTP request."""
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status_code).inc()
-        REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(duration)
+        count, request_duration, overhead, errors = self._children(method, endpoint, status_code)
+        count.inc()
+        request_duration.observe(duration)
+        
+        downstream = _downstream_time.get()
+        if downstream is not None:
+            # Concurrent downstream calls can add up to more than the wall time
+            overhead.observe(max(duration - downstream[0], 0.0))
         
-        if status_code >= 400:
-            ERROR_COUNT.labels(method=method, endpoint=endpoint, status=status_code).inc()
+        if errors is not None:
+            errors.inc()
     
-    def start_request(self):
-        """Mark the start of an HTTP request."""
+    def start_request(self, request_start: Optional[str] = None):
+        """Mark the start of an HTTP request, given its X-Request-Start header if any."""
         ACTIVE_REQUESTS.inc()
-        return time.time()
+        _downstream_time.set([0.0])
+        if request_start:
+            received_at = _parse_request_start(request_start)
+            if received_at is not None:
+                REQUEST_QUEUE_TIME.observe(max(time.time() - received_at, 0.0))
+        return time.perf_counter()
     
     def end_request(self):
         """Mark the end of an HTTP request."""
@@ -130,21 +260,23 @@ class PrometheusMetrics:
     @property
     def books_browsed(self):
         """Access to books browsed counter."""
-        return BOOKS_BROWSED
+        return self._books_browsed
     
     @property
     def books_viewed(self):
         """Access to books viewed counter."""
-        return BOOKS_VIEWED
+        return self._books_viewed
     
     @property
     def catalog_search_queries(self):
         """Access to catalog search queries counter."""
-        return CATALOG_SEARCH_QUERIES
+        return self._catalog_search_queries
     
     def get_metrics(self):
         """Get Prometheus metrics in the expected format."""
-        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+        for counter in (self._books_browsed, self._books_viewed, self._catalog_search_queries):
+            counter.flush()
+        return Response(generate_latest(scrape_registry()), media_type=CONTENT_TYPE_LATEST)
 
 
 # Global metrics instance (will be initialized in each service)
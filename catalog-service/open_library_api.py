@@ -5,12 +5,41 @@ Provides access to Open Library's vast collection of books with covers and metad
 
 import httpx
 import logging
-from typing import List, Dict, Optional, Any
+import orjson
+from typing import List, Dict, Optional, Any, Tuple
 from urllib.parse import quote
 import asyncio
+import random
+
+from cache import ResponseCache, make_key, response_cache
+from metrics import HTTPX_EVENT_HOOKS
 
 logger = logging.getLogger(__name__)
 
+# Curated subject names for browsing via get_books_by_subject
+POPULAR_SUBJECTS: Tuple[str, ...] = (
+    "science_fiction",
+    "fantasy",
+    "mystery",
+    "romance",
+    "thriller",
+    "history",
+    "biography",
+    "philosophy",
+    "science",
+    "technology",
+    "business",
+    "self_help",
+    "fiction",
+    "non_fiction",
+    "young_adult",
+    "children",
+    "poetry",
+    "drama",
+    "humor",
+    "travel",
+)
+
 class OpenLibraryAPI:
     """Client for interacting with Open Library API."""
     
@@ -19,14 +48,56 @@ class OpenLibraryAPI:
     SEARCH_URL = "https://openlibrary.org/search.json"
     SUBJECTS_URL = "https://openlibrary.org/subjects"
     
-    def __init__(self, timeout: int = 10):
+    # Upper bound on concurrent outbound Open Library requests
+    MAX_CONCURRENT_REQUESTS = 32
+    
+    # Transport errors and 5xx responses are retried with jittered
+    # exponential backoff, up to MAX_ATTEMPTS tries in total (delays in seconds)
+    MAX_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 0.2
+    RETRY_MAX_DELAY = 2.0
+    
+    # Cache lifetime for Open Library responses, and how long past that a
+    # stale copy is still served while it refreshes (seconds)
+    CACHE_TTL = 3600
+    CACHE_STALE_TTL = 300
+    
+    def __init__(self, timeout: int = 10, cache: Optional[ResponseCache] = None):
         self.timeout = timeout
-        self.client = httpx.AsyncClient(timeout=timeout)
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            event_hooks=HTTPX_EVENT_HOOKS
+        )
+        self._request_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
     
     async def close(self):
         """Close the HTTP client."""
         await self.client.aclose()
     
+    async def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """
+        GET an Open Library URL with bounded concurrency and bounded retries.
+        
+        Returns the last response (which may still be a 5xx) or re-raises the
+        last transport error once MAX_ATTEMPTS is exhausted.
+        """
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                async with self._request_semaphore:
+                    response = await self.client.get(url, params=params)
+                if response.status_code < 500 or attempt == self.MAX_ATTEMPTS:
+                    return response
+            except httpx.TransportError:
+                if attempt == self.MAX_ATTEMPTS:
+                    raise
+            
+            # Full jitter, outside the semaphore so waiting retries don't hold a slot
+            backoff = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, backoff))
+    
     async def search_books(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
         """
         Search for books using Open Library search API.
@@ -40,35 +111,44 @@ class OpenLibraryAPI:
             Dictionary containing search results and metadata
         """
         try:
-            params = {
-                "q": query,
-                "limit": limit,
-                "offset": offset,
-                "fields": "key,title,author_name,first_publish_year,isbn,cover_i,publisher,subject,language,edition_count"
-            }
-            
-            response = await self.client.get(self.SEARCH_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Transform the data to our format
-            books = []
-            for doc in data.get("docs", []):
-                book = self._transform_search_result(doc)
-                if book:
-                    books.append(book)
-            
-            return {
-                "books": books,
-                "total": data.get("numFound", 0),
-                "offset": offset,
-                "limit": limit
-            }
+            if self.cache is None:
+                return await self._fetch_search(query, limit, offset)
+            key = make_key("olib:search", query, limit, offset)
+            return await self.cache.get_or_set(
+                key, self.CACHE_TTL, lambda: self._fetch_search(query, limit, offset), self.CACHE_STALE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Error searching books: {str(e)}")
             return {"books": [], "total": 0, "offset": offset, "limit": limit}
     
+    async def _fetch_search(self, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        """Run a search against Open Library, raising on failure."""
+        params = {
+            "q": query,
+            "limit": limit,
+            "offset": offset,
+            "fields": "key,title,author_name,first_publish_year,isbn,cover_i,publisher,subject,language,edition_count"
+        }
+        
+        response = await self._get(self.SEARCH_URL, params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        # Transform the data to our format
+        books = []
+        for doc in data.get("docs", []):
+            book = self._transform_search_result(doc)
+            if book:
+                books.append(book)
+        
+        return {
+            "books": books,
+            "total": data.get("numFound", 0),
+            "offset": offset,
+            "limit": limit
+        }
+    
     async def get_books_by_subject(self, subject: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
         """
         Get books by subject category from Open Library.
@@ -81,40 +161,50 @@ class OpenLibraryAPI:
         Returns:
             Dictionary containing books and metadata
         """
+        # Clean and format subject
+        subject = subject.lower().replace(" ", "_").replace("-", "_")
+        
         try:
-            # Clean and format subject
-            subject = subject.lower().replace(" ", "_").replace("-", "_")
-            url = f"{self.SUBJECTS_URL}/{subject}.json"
-            
-            params = {
-                "limit": limit,
-                "offset": offset,
-                "details": "true"
-            }
-            
-            response = await self.client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Transform the data to our format
-            books = []
-            for work in data.get("works", []):
-                book = self._transform_subject_result(work)
-                if book:
-                    books.append(book)
-            
-            return {
-                "books": books,
-                "total": data.get("work_count", 0),
-                "offset": offset,
-                "limit": limit,
-                "subject": subject
-            }
+            if self.cache is None:
+                return await self._fetch_subject(subject, limit, offset)
+            key = make_key("olib:subject", subject, limit, offset)
+            return await self.cache.get_or_set(
+                key, self.CACHE_TTL, lambda: self._fetch_subject(subject, limit, offset), self.CACHE_STALE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Error getting books by subject '{subject}': {str(e)}")
             return {"books": [], "total": 0, "offset": offset, "limit": limit, "subject": subject}
     
+    async def _fetch_subject(self, subject: str, limit: int, offset: int) -> Dict[str, Any]:
+        """Fetch a subject listing from Open Library, raising on failure."""
+        url = f"{self.SUBJECTS_URL}/{subject}.json"
+        
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "details": "true"
+        }
+        
+        response = await self._get(url, params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        # Transform the data to our format
+        books = []
+        for work in data.get("works", []):
+            book = self._transform_subject_result(work)
+            if book:
+                books.append(book)
+        
+        return {
+            "books": books,
+            "total": data.get("work_count", 0),
+            "offset": offset,
+            "limit": limit,
+            "subject": subject
+        }
+    
     async def get_book_by_isbn(self, isbn: str) -> Optional[Dict[str, Any]]:
         """
         Get book details by ISBN.
@@ -126,51 +216,44 @@ class OpenLibraryAPI:
             Book details dictionary or None if not found
         """
         try:
-            url = f"{self.BASE_URL}/isbn/{isbn}.json"
-            response = await self.client.get(url)
-            
-            if response.status_code == 404:
-                return None
-                
-            response.raise_for_status()
-            data = response.json()
-            
-            return self._transform_isbn_result(data, isbn)
+            if self.cache is None:
+                return await self._fetch_isbn(isbn)
+            # Key on the bare ISBN so hyphenated and plain forms share an entry
+            key = make_key("olib:isbn", "".join(ch for ch in isbn if ch.isalnum()))
+            return await self.cache.get_or_set(
+                key, self.CACHE_TTL, lambda: self._fetch_isbn(isbn), self.CACHE_STALE_TTL
+            )
             
         except Exception as e:
             logger.error(f"Error getting book by ISBN '{isbn}': {str(e)}")
             return None
     
-    async def get_popular_subjects(self) -> List[str]:
+    async def _fetch_isbn(self, isbn: str) -> Optional[Dict[str, Any]]:
+        """Fetch an edition by ISBN from Open Library, raising on failure."""
+        url = f"{self.BASE_URL}/isbn/{isbn}.json"
+        response = await self._get(url)
+        
+        if response.status_code == 404:
+            return None
+            
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        return self._transform_isbn_result(data, isbn)
+    
+    async def get_many_by_isbn(self, isbns: List[str]) -> List[Optional[Dict[str, Any]]]:
         """
-        Get list of popular subject categories.
+        Get book details for several ISBNs concurrently.
         
+        Args:
+            isbns: Book ISBNs to look up
+            
         Returns:
-            List of popular subject names
+            Book details (or None when not found) in the same order as isbns
         """
-        popular_subjects = [
-            "science_fiction",
-            "fantasy",
-            "mystery",
-            "romance",
-            "thriller",
-            "history",
-            "biography",
-            "philosophy",
-            "science",
-            "technology",
-            "business",
-            "self_help",
-            "fiction",
-            "non_fiction",
-            "young_adult",
-            "children",
-            "poetry",
-            "drama",
-            "humor",
-            "travel"
-        ]
-        return popular_subjects
+        # Outbound concurrency is capped per request in _get
+        results = await asyncio.gather(*(self.get_book_by_isbn(isbn) for isbn in isbns), return_exceptions=True)
+        return [None if isinstance(result, Exception) else result for result in results]
     
     def get_cover_url(self, cover_id: Optional[int] = None, isbn: Optional[str] = None, size: str = "M") -> Optional[str]:
         """
@@ -316,4 +399,4 @@ class OpenLibraryAPI:
             }
 
 # Global instance
-open_library_api = OpenLibraryAPI()
+open_library_api = OpenLibraryAPI(cache=response_cache)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, create_model
+from pydantic.fields import FieldInfo
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Type
 
 class BookBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=500)
@@ -21,35 +22,39 @@ class BookBase(BaseModel):
 class BookCreate(BookBase):
     pass
 
-class BookUpdate(BaseModel):
-    title: Optional[str] = Field(None, min_length=1, max_length=500)
-    author: Optional[str] = Field(None, min_length=1, max_length=200)
-    isbn: Optional[str] = Field(None, max_length=20)
-    description: Optional[str] = Field(None, max_length=2000)
-    category: Optional[str] = Field(None, max_length=100)
-    price: Optional[float] = Field(None, gt=0)
-    rent_price: Optional[float] = Field(None, gt=0)
-    available: Optional[bool] = None
-    stock_quantity: Optional[int] = Field(None, ge=0)
-    publication_year: Optional[int] = Field(None, ge=1000, le=2100)
-    publisher: Optional[str] = Field(None, max_length=200)
-    cover_url: Optional[str] = Field(None, max_length=500)
-    source: Optional[str] = Field(None, max_length=50)
-    external_key: Optional[str] = Field(None, max_length=200)
+def make_partial(model: Type[BaseModel], name: str) -> Type[BaseModel]:
+    """Build a model with every field of model made optional, keeping its constraints."""
+    fields = {
+        field_name: (Optional[field.annotation], FieldInfo.merge_field_infos(field, default=None))
+        for field_name, field in model.model_fields.items()
+    }
+    return create_model(name, **fields)
+
+# Partial update: any subset of BookBase fields, validated with the same limits
+BookUpdate = make_partial(BookBase, "BookUpdate")
 
 class BookResponse(BookBase):
     id: int
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class BookListResponse(BaseModel):
     books: List[BookResponse]
     total: int
     page: int
     size: int
+
+# A book from GET /books?fields=...: only the requested fields (and id) are present
+PartialBookResponse = make_partial(BookResponse, "PartialBookResponse")
+
+class PartialBookListResponse(BaseModel):
+    """Book list whose items carry every BookResponse field without fields=, or a subset with it"""
+    books: List[PartialBookResponse]
+    total: int
+    page: int
+    size: int
     
 class BookSearchQuery(BaseModel):
     search: Optional[str] = None
@@ -96,3 +101,9 @@ class ExternalBookImport(BaseModel):
     rent_price: float = Field(..., gt=0, description="Rental price for local catalog")
     stock_quantity: int = Field(1, ge=0, description="Initial stock quantity")
     category: Optional[str] = None  # Override category if needed
+
+class BookImportBatchResponse(BaseModel):
+    """Result of creating or importing a batch of books."""
+    created: int
+    skipped: List[str]
+    books: List[BookResponse]
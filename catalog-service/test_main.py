@@ -1,28 +1,71 @@
+import asyncio
+import httpx
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
 from unittest.mock import patch
+from cache import response_cache
+import crud
 from database import Base, get_db
 from main import app
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_catalog.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Every test is a coroutine run by anyio's pytest plugin on asyncio
+pytestmark = pytest.mark.anyio
 
-Base.metadata.create_all(bind=engine)
+# Test database: one in-memory SQLite connection shared by every session
+engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+# Let SQLAlchemy emit BEGIN itself; the driver's implicit transactions would
+# otherwise make the app's savepoint commits permanent
+@event.listens_for(engine.sync_engine, "connect")
+def disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine.sync_engine, "begin")
+def begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
 
-app.dependency_overrides[get_db] = override_get_db
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """Create the schema once for the whole session, not at import."""
+    asyncio.run(create_tables())
 
-client = TestClient(app)
+@pytest.fixture(autouse=True)
+async def db_connection(test_database):
+    """Run each test inside a transaction that is rolled back afterwards."""
+    async with engine.connect() as connection:
+        await connection.begin()
+        
+        async def override_get_db():
+            # Commits inside the app release a savepoint of this transaction
+            async with AsyncSession(
+                bind=connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
+            ) as db:
+                yield db
+        
+        app.dependency_overrides[get_db] = override_get_db
+        yield connection
+        app.dependency_overrides.pop(get_db, None)
+        await connection.rollback()
+    
+    # Cached listings may hold rows that no longer exist
+    await response_cache.bump_version(crud.CATALOG_VERSION_KEY)
+
+@pytest.fixture
+async def client():
+    """HTTP client calling the app in-process on the test's event loop."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
 
 # Mock admin user for testing
 def mock_get_admin_user():
@@ -36,19 +79,19 @@ def admin_override():
     yield
     app.dependency_overrides.pop(get_admin_user, None)
 
-def test_health_check():
-    response = client.get("/")
+async def test_health_check(client):
+    response = await client.get("/")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy", "service": "catalog-service"}
 
-def test_get_empty_books():
-    response = client.get("/books")
+async def test_get_empty_books(client):
+    response = await client.get("/books")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] == 0
     assert data["books"] == []
 
-def test_create_book(admin_override):
+async def test_create_book(client, admin_override):
     book_data = {
         "title": "Test Book",
         "author": "Test Author",
@@ -63,7 +106,7 @@ def test_create_book(admin_override):
         "publisher": "Test Publisher"
     }
     
-    response = client.post("/books", json=book_data)
+    response = await client.post("/books", json=book_data)
     assert response.status_code == 200
     data = response.json()
     assert data["title"] == "Test Book"
@@ -72,7 +115,7 @@ def test_create_book(admin_override):
     assert data["rent_price"] == 3.99
     assert "id" in data
 
-def test_get_books_after_creation(admin_override):
+async def test_get_books_after_creation(client, admin_override):
     # Create a book first
     book_data = {
         "title": "Another Test Book",
@@ -80,16 +123,16 @@ def test_get_books_after_creation(admin_override):
         "price": 39.99,
         "rent_price": 4.99
     }
-    client.post("/books", json=book_data)
+    await client.post("/books", json=book_data)
     
     # Get books
-    response = client.get("/books")
+    response = await client.get("/books")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] >= 1
     assert len(data["books"]) >= 1
 
-def test_get_book_by_id(admin_override):
+async def test_get_book_by_id(client, admin_override):
     # Create a book first
     book_data = {
         "title": "Specific Test Book",
@@ -97,22 +140,22 @@ def test_get_book_by_id(admin_override):
         "price": 19.99,
         "rent_price": 2.99
     }
-    create_response = client.post("/books", json=book_data)
+    create_response = await client.post("/books", json=book_data)
     book_id = create_response.json()["id"]
     
     # Get the specific book
-    response = client.get(f"/books/{book_id}")
+    response = await client.get(f"/books/{book_id}")
     assert response.status_code == 200
     data = response.json()
     assert data["title"] == "Specific Test Book"
     assert data["id"] == book_id
 
-def test_get_nonexistent_book():
-    response = client.get("/books/99999")
+async def test_get_nonexistent_book(client):
+    response = await client.get("/books/99999")
     assert response.status_code == 404
     assert "Book not found" in response.json()["detail"]
 
-def test_update_book(admin_override):
+async def test_update_book(client, admin_override):
     # Create a book first
     book_data = {
         "title": "Update Test Book",
@@ -120,7 +163,7 @@ def test_update_book(admin_override):
         "price": 25.99,
         "rent_price": 3.99
     }
-    create_response = client.post("/books", json=book_data)
+    create_response = await client.post("/books", json=book_data)
     book_id = create_response.json()["id"]
     
     # Update the book
@@ -128,14 +171,14 @@ def test_update_book(admin_override):
         "title": "Updated Test Book",
         "price": 35.99
     }
-    response = client.put(f"/books/{book_id}", json=update_data)
+    response = await client.put(f"/books/{book_id}", json=update_data)
     assert response.status_code == 200
     data = response.json()
     assert data["title"] == "Updated Test Book"
     assert data["price"] == 35.99
     assert data["author"] == "Update Author"  # Should remain unchanged
 
-def test_delete_book(admin_override):
+async def test_delete_book(client, admin_override):
     # Create a book first
     book_data = {
         "title": "Delete Test Book",
@@ -143,19 +186,19 @@ def test_delete_book(admin_override):
         "price": 15.99,
         "rent_price": 1.99
     }
-    create_response = client.post("/books", json=book_data)
+    create_response = await client.post("/books", json=book_data)
     book_id = create_response.json()["id"]
     
     # Delete the book
-    response = client.delete(f"/books/{book_id}")
+    response = await client.delete(f"/books/{book_id}")
     assert response.status_code == 200
     assert "deleted successfully" in response.json()["message"]
     
     # Verify book is deleted
-    get_response = client.get(f"/books/{book_id}")
+    get_response = await client.get(f"/books/{book_id}")
     assert get_response.status_code == 404
 
-def test_search_books(admin_override):
+async def test_search_books(client, admin_override):
     # Create test books
     books_data = [
         {"title": "Python Programming", "author": "John Doe", "category": "Programming", "price": 49.99, "rent_price": 5.99},
@@ -163,22 +206,39 @@ def test_search_books(admin_override):
     ]
     
     for book_data in books_data:
-        client.post("/books", json=book_data)
+        await client.post("/books", json=book_data)
     
     # Test search by title
-    response = client.get("/books?search=Python")
+    response = await client.get("/books?search=Python")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] >= 1
     assert any("Python" in book["title"] for book in data["books"])
     
     # Test filter by category
-    response = client.get("/books?category=Programming")
+    response = await client.get("/books?category=Programming")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] >= 1
 
-def test_get_categories(admin_override):
+async def test_get_books_selected_fields(client, admin_override):
+    await client.post("/books", json={"title": "Fields Book", "author": "Fields Author", "price": 9.99, "rent_price": 0.99})
+    
+    response = await client.get("/books?fields=title,price")
+    assert response.status_code == 200
+    books = response.json()["books"]
+    assert books
+    assert all(set(book) == {"id", "title", "price"} for book in books)
+    
+    response = await client.get("/books?fields=title,password")
+    assert response.status_code == 400
+    
+    # The documented item schema must accept projected books
+    schema = (await client.get("/openapi.json")).json()["components"]["schemas"]
+    assert "required" not in schema["PartialBookResponse"]
+    assert schema["PartialBookListResponse"]["required"] == ["books", "total", "page", "size"]
+
+async def test_get_categories(client, admin_override):
     # Create a book with a category
     book_data = {
         "title": "Category Test Book",
@@ -187,15 +247,15 @@ def test_get_categories(admin_override):
         "price": 20.99,
         "rent_price": 2.99
     }
-    client.post("/books", json=book_data)
+    await client.post("/books", json=book_data)
     
-    response = client.get("/categories")
+    response = await client.get("/categories")
     assert response.status_code == 200
     data = response.json()
     assert "categories" in data
     assert isinstance(data["categories"], list)
 
-def test_create_book_duplicate_isbn(admin_override):
+async def test_create_book_duplicate_isbn(client, admin_override):
     book_data = {
         "title": "Duplicate ISBN Book",
         "author": "Duplicate Author",
@@ -205,10 +265,304 @@ def test_create_book_duplicate_isbn(admin_override):
     }
     
     # Create first book
-    response1 = client.post("/books", json=book_data)
+    response1 = await client.post("/books", json=book_data)
     assert response1.status_code == 200
     
     # Try to create book with same ISBN
-    response2 = client.post("/books", json=book_data)
+    response2 = await client.post("/books", json=book_data)
     assert response2.status_code == 400
     assert "already exists" in response2.json()["detail"]
+
+async def test_verify_user_token_is_cached():
+    from unittest.mock import AsyncMock
+    from fastapi import Request
+    from fastapi.security import HTTPAuthorizationCredentials
+    import auth
+    
+    user = {"id": 2, "email": "reader@seneca.ca", "full_name": "Reader"}
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="cached-token")
+    mock_get = AsyncMock(return_value=httpx.Response(200, json=user))
+    
+    with patch.object(auth.http_client, "get", mock_get):
+        # Separate requests share the token cache
+        assert await auth.verify_user_token(Request({"type": "http"}), credentials) == user
+        request = Request({"type": "http"})
+        assert await auth.verify_user_token(request, credentials) == user
+        
+        # Within one request the user on request.state is reused outright
+        auth._token_cache.clear()
+        assert await auth.verify_user_token(request, credentials) == user
+    
+    assert mock_get.await_count == 1
+    assert request.state.user == user
+
+async def test_admin_stock_update_verifies_token(client, admin_override):
+    from unittest.mock import AsyncMock
+    import auth
+    
+    created = await client.post("/books", json={
+        "title": "Stock Book", "author": "Stock Author", "price": 10.0, "rent_price": 1.0, "stock_quantity": 5
+    })
+    book_id = created.json()["id"]
+    
+    async def user_for_token(url, headers):
+        email = "admin@seneca.ca" if headers["Authorization"] == "Bearer admin-token" else "reader@seneca.ca"
+        return httpx.Response(200, json={"id": 1, "email": email, "full_name": "User"})
+    
+    auth._token_cache.clear()
+    with patch.object(auth.http_client, "get", AsyncMock(side_effect=user_for_token)):
+        response = await client.put(
+            f"/books/{book_id}/stock", json={"quantity_change": 3},
+            headers={"Authorization": "Bearer admin-token"}
+        )
+        assert response.status_code == 200
+        assert response.json()["stock_quantity"] == 8
+        
+        response = await client.put(
+            f"/books/{book_id}/stock", json={"quantity_change": 3},
+            headers={"Authorization": "Bearer reader-token"}
+        )
+        assert response.status_code == 403
+        
+        response = await client.put(
+            "/books/999999/stock", json={"quantity_change": 3},
+            headers={"Authorization": "Bearer admin-token"}
+        )
+        assert response.status_code == 404
+    auth._token_cache.clear()
+
+async def test_categories_refresh_after_create(client, admin_override):
+    await client.get("/categories")
+    
+    book_data = {
+        "title": "Fresh Category Book",
+        "author": "Fresh Author",
+        "category": "FreshCategory",
+        "price": 22.99,
+        "rent_price": 2.49
+    }
+    await client.post("/books", json=book_data)
+    
+    response = await client.get("/categories")
+    assert "FreshCategory" in response.json()["categories"]
+    
+    response = await client.get("/authors")
+    assert "Fresh Author" in response.json()["authors"]
+
+async def test_seed_data_skips_existing(client, admin_override):
+    await client.post("/seed-data")
+    
+    response = await client.post("/seed-data")
+    assert response.status_code == 200
+    assert response.json()["books"] == []
+    
+    response = await client.get("/books?search=Database Design Fundamentals")
+    assert response.json()["total"] == 1
+
+async def test_metrics_use_route_template(client):
+    await client.get("/books/424242")
+    
+    response = await client.get("/metrics")
+    assert 'endpoint="/books/{book_id}"' in response.text
+    assert 'endpoint="/books/424242"' not in response.text
+
+async def test_metrics_record_overhead_and_queue_time(client):
+    import time
+    await client.get("/books", headers={"X-Request-Start": f"t={int(time.time() * 1000)}"})
+    
+    response = await client.get("/metrics")
+    assert 'endpoint_overhead_seconds_count{endpoint="/books",method="GET"}' in response.text
+    assert "http_request_queue_seconds_count 1.0" in response.text
+
+def test_failed_query_timer_is_cleared():
+    from types import SimpleNamespace
+    import database
+    import metrics
+    
+    conn = SimpleNamespace(info={})
+    token = metrics._downstream_time.set([0.0])
+    try:
+        database.start_query_timer(conn, None, "SELECT 1", (), None, False)
+        database.stop_failed_query_timer(SimpleNamespace(connection=conn))
+        # Failed queries still count as downstream time and leave nothing behind
+        assert "query_start" not in conn.info
+        assert metrics._downstream_time.get()[0] > 0
+    finally:
+        metrics._downstream_time.reset(token)
+
+async def test_metrics_ignore_invalid_request_start(client):
+    from prometheus_client import REGISTRY
+    from metrics import _parse_request_start
+    before = REGISTRY.get_sample_value("http_request_queue_seconds_count") or 0
+    
+    for header in ("t=inf", "t=nan", "t=-1", "t=1e400"):
+        assert _parse_request_start(header) is None
+        response = await client.get("/books", headers={"X-Request-Start": header})
+        assert response.status_code == 200
+    
+    assert (REGISTRY.get_sample_value("http_request_queue_seconds_count") or 0) == before
+    # ns, us and ms timestamps all scale down to seconds
+    assert _parse_request_start("t=1700000000000000000") == pytest.approx(1.7e9)
+    assert _parse_request_start("t=1700000000000000") == pytest.approx(1.7e9)
+    assert _parse_request_start("t=1700000000000") == pytest.approx(1.7e9)
+    assert _parse_request_start("t=1e30") is None
+
+async def test_books_browsed_counter_flushed_on_scrape(client):
+    from metrics import BOOKS_BROWSED
+    await client.get("/metrics")
+    before = BOOKS_BROWSED._value.get()
+    await client.get("/books")
+    await client.get("/books")
+    
+    await client.get("/metrics")
+    assert BOOKS_BROWSED._value.get() == before + 2
+
+async def test_create_book_duplicate_isbn_ignores_hyphens(client, admin_override):
+    book_data = {
+        "title": "Hyphenated ISBN Book",
+        "author": "Hyphen Author",
+        "isbn": "978-2222222222",
+        "price": 30.99,
+        "rent_price": 3.99
+    }
+    response = await client.post("/books", json=book_data)
+    assert response.status_code == 200
+    
+    book_data["isbn"] = "9782222222222"
+    response = await client.post("/books", json=book_data)
+    assert response.status_code == 400
+
+async def test_external_isbn_batch_preserves_order(client):
+    from unittest.mock import AsyncMock
+    from open_library_api import open_library_api
+    
+    found = {"title": "Found Book", "author": "Found Author", "isbn": "1111111111"}
+    lookup = AsyncMock(side_effect=lambda isbn: found if isbn == "1111111111" else None)
+    
+    with patch.object(open_library_api, "get_book_by_isbn", lookup):
+        response = await client.post("/books/external/isbn/batch", json=["0000000000", "1111111111"])
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data[0] is None
+    assert data[1]["title"] == "Found Book"
+    assert lookup.await_count == 2
+
+async def test_response_cache_single_flight():
+    from cache import ResponseCache
+    
+    cache = ResponseCache()
+    calls = []
+    
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 42}
+    
+    results = await asyncio.gather(*(cache.get_or_set("key", 60, factory) for _ in range(5)))
+    assert results == [{"value": 42}] * 5
+    assert len(calls) == 1
+
+async def test_open_library_retries_server_errors():
+    from unittest.mock import AsyncMock
+    from open_library_api import OpenLibraryAPI
+    
+    api = OpenLibraryAPI()
+    request = httpx.Request("GET", OpenLibraryAPI.SEARCH_URL)
+    responses = [
+        httpx.Response(503, request=request),
+        httpx.Response(200, json={"docs": [], "numFound": 7}, request=request)
+    ]
+    with patch.object(api.client, "get", AsyncMock(side_effect=responses)) as mock_get, \
+            patch("open_library_api.asyncio.sleep", AsyncMock()):
+        result = await api.search_books("retry")
+    
+    assert mock_get.call_count == 2
+    assert result["total"] == 7
+
+async def test_search_treats_wildcards_literally(client, admin_override):
+    book_data = {
+        "title": "100% Literal Title",
+        "author": "Wildcard Author",
+        "price": 12.99,
+        "rent_price": 1.99
+    }
+    await client.post("/books", json=book_data)
+    
+    response = await client.get("/books", params={"search": "100%"})
+    assert response.json()["total"] == 1
+    
+    response = await client.get("/books", params={"search": "%"})
+    assert all("%" in book["title"] for book in response.json()["books"])
+
+async def test_import_books_batch(client, admin_override):
+    def import_payload(title, isbn):
+        return {
+            "external_book": {"title": title, "author": "Batch Author", "isbn": isbn},
+            "price": 19.99,
+            "rent_price": 2.99,
+            "stock_quantity": 3
+        }
+    
+    await client.post("/books/import", json=import_payload("Already Here", "978-3333333333"))
+    
+    response = await client.post("/books/import/batch", json=[
+        import_payload("Already Here Again", "9783333333333"),
+        import_payload("Batch Book One", "978-4444444444"),
+        import_payload("Batch Book One Duplicate", "9784444444444"),
+        import_payload("Batch Book Two", None)
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["skipped"] == ["9783333333333", "9784444444444"]
+    assert {book["title"] for book in data["books"]} == {"Batch Book One", "Batch Book Two"}
+
+async def test_create_books_batch(client, admin_override):
+    def book_payload(title, isbn):
+        return {"title": title, "author": "Bulk Author", "isbn": isbn, "price": 9.99, "rent_price": 1.99}
+    
+    await client.post("/books", json=book_payload("Existing Bulk Book", "978-5555555555"))
+    
+    response = await client.post("/books/batch", json=[
+        book_payload("Existing Bulk Book Again", "9785555555555"),
+        book_payload("Bulk Book One", "978-6666666666"),
+        book_payload("Bulk Book Two", "978-7777777777")
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["skipped"] == ["9785555555555"]
+    
+    response = await client.get("/books", params={"author": "Bulk Author"})
+    assert response.json()["total"] == 3
+
+async def test_get_books_batch(client, admin_override):
+    created = await client.post("/books/batch", json=[
+        {"title": "Lookup One", "author": "Lookup Author", "isbn": "978-8888888881", "price": 5.0, "rent_price": 1.0},
+        {"title": "Lookup Two", "author": "Lookup Author", "isbn": "978-8888888882", "price": 6.0, "rent_price": 1.0}
+    ])
+    first, second = sorted(book["id"] for book in created.json()["books"])
+    
+    response = await client.get("/books/batch", params={"ids": [second, 99999, first]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [book and book["title"] for book in data] == ["Lookup Two", None, "Lookup One"]
+    
+    response = await client.get("/books/batch", params={"ids": list(range(1, 102))})
+    assert response.status_code == 422
+
+async def test_response_cache_serves_stale_while_refreshing():
+    from cache import ResponseCache
+    
+    cache = ResponseCache()
+    values = iter([1, 2])
+    
+    async def factory():
+        return next(values)
+    
+    first = await cache.get_or_set("key", 0, factory, stale_ttl=60)
+    stale = await cache.get_or_set("key", 0, factory, stale_ttl=60)
+    await asyncio.sleep(0.01)
+    _, refreshed = await cache.get("key")
+    assert (first, stale, refreshed) == (1, 1, 2)
@@ -1,8 +1,13 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import requests
+from cachetools import TTLCache
+import hashlib
+import asyncio
+import httpx
 import os
-from typing import Optional
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
 
 # Security
 security = HTTPBearer()
@@ -10,29 +15,166 @@ security = HTTPBearer()
 # Configuration
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
 CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://localhost:8002")
+# Most IDs the catalog's GET /books/batch and the user service's
+# GET /users/batch accept per request
+BOOK_BATCH_SIZE = 100
+USER_BATCH_SIZE = 100
 
-async def verify_user_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Verify user token by calling user service."""
+# Shared HTTP clients so service calls reuse keep-alive connections instead of
+# opening one per request (closed from the application lifespan in main.py)
+user_client = httpx.AsyncClient(
+    base_url=USER_SERVICE_URL,
+    timeout=5.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+)
+# Every order makes a book lookup and a stock update, so keep more catalog
+# connections idle for order bursts rather than reconnecting past 20
+catalog_client = httpx.AsyncClient(
+    base_url=CATALOG_SERVICE_URL,
+    timeout=5.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30),
+)
+
+# GETs to other services are retried on connection errors and 5xx responses
+# with full-jitter exponential backoff, up to MAX_ATTEMPTS tries in total
+# (delays in seconds)
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 1.0
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Fail fast while a downstream service keeps failing.
+    
+    After fail_max consecutive failed calls the breaker opens and calls are
+    rejected without touching the network. Once reset_timeout seconds have
+    passed calls are let through again; the first failure re-opens it and
+    the first success closes it.
+    """
+    
+    def __init__(self, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+    
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout
+    
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+    
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.fail_max:
+            self._opened_at = time.monotonic()
+
+user_breaker = CircuitBreaker()
+catalog_breaker = CircuitBreaker()
+
+async def _send(
+    client: httpx.AsyncClient,
+    breaker: CircuitBreaker,
+    method: str,
+    url: str,
+    attempts: int = MAX_ATTEMPTS,
+    **kwargs
+) -> httpx.Response:
+    """
+    Call another service through its circuit breaker, with bounded retries.
+    
+    Returns the last response (which may still be a 5xx) or re-raises the
+    last transport error once attempts are exhausted. Raises
+    CircuitOpenError without a network call while the breaker is open.
+    """
+    if breaker.is_open:
+        raise CircuitOpenError(f"Circuit open for {client.base_url}")
+    
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+            if attempt == attempts:
+                breaker.record_failure()
+                return response
+        except httpx.TransportError:
+            if attempt == attempts:
+                breaker.record_failure()
+                raise
+        
+        backoff = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        await asyncio.sleep(random.uniform(0, backoff))
+
+# Recently verified tokens, keyed by a digest of the token (raw tokens are never stored)
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+_token_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL)
+_INVALID_TOKEN = object()
+
+# Recently fetched catalog books. Stock can be up to BOOK_CACHE_TTL seconds
+# stale; this service's own stock updates evict the entry straight away
+BOOK_CACHE_TTL = int(os.getenv("BOOK_CACHE_TTL", "30"))
+_book_cache = TTLCache(maxsize=10000, ttl=BOOK_CACHE_TTL)
+
+def _token_key(token: str) -> str:
+    """Hash a bearer token for use as a cache key."""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+def _unauthorized() -> HTTPException:
+    """Build the 401 raised for rejected tokens."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def verify_user_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verify user token by calling user service.
+    
+    The verified user is stored on request.state.user, so anything else in
+    the same request reads it from there instead of verifying again.
+    """
+    user_data = getattr(request.state, "user", None)
+    if user_data is not None:
+        return user_data
+    
     token = credentials.credentials
+    cache_key = _token_key(token)
+    
+    cached = _token_cache.get(cache_key)
+    if cached is _INVALID_TOKEN:
+        raise _unauthorized()
+    if cached is not None:
+        request.state.user = cached
+        return cached
     
     try:
         # Call user service to verify token
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{USER_SERVICE_URL}/me", headers=headers, timeout=5)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except requests.RequestException:
+        response = await _send(user_client, user_breaker, "GET", "/me", headers=headers)
+    except httpx.RequestError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="User service unavailable"
         )
+    
+    if response.status_code == 200:
+        user_data = response.json()
+        _token_cache[cache_key] = user_data
+        request.state.user = user_data
+        return user_data
+    
+    if response.status_code == 401:
+        # Remember rejected tokens briefly so retries short-circuit too
+        _token_cache[cache_key] = _INVALID_TOKEN
+    raise _unauthorized()
 
 async def get_current_user(user_data: dict = Depends(verify_user_token)) -> dict:
     """Get current authenticated user."""
@@ -47,10 +189,37 @@ async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict
         )
     return current_user
 
+async def _get_users_batch(user_ids: List[int], authorization: str) -> List[Optional[dict]]:
+    """Look up one batch of users with the user service's batch endpoint."""
+    try:
+        response = await _send(
+            user_client, user_breaker, "GET", "/users/batch",
+            params={"ids": user_ids}, headers={"Authorization": authorization}
+        )
+    except httpx.RequestError:
+        return []
+    return response.json() if response.status_code == 200 else []
+
+async def get_user_emails(user_ids: Iterable[int], authorization: Optional[str]) -> Dict[int, str]:
+    """
+    Get user emails keyed by user ID, in as few user-service calls as possible.
+    
+    The batch endpoint is admin-only, so the caller's Authorization header
+    is forwarded. Users that cannot be looked up are left out rather than
+    failing the caller.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids or not authorization:
+        return {}
+    
+    batches = [user_ids[i:i + USER_BATCH_SIZE] for i in range(0, len(user_ids), USER_BATCH_SIZE)]
+    results = await asyncio.gather(*(_get_users_batch(batch, authorization) for batch in batches))
+    return {user["id"]: user["email"] for users in results for user in users if user}
+
 async def get_book_info(book_id: int) -> Optional[dict]:
     """Get book information from catalog service."""
     try:
-        response = requests.get(f"{CATALOG_SERVICE_URL}/books/{book_id}", timeout=5)
+        response = await _send(catalog_client, catalog_breaker, "GET", f"/books/{book_id}")
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 404:
@@ -60,12 +229,125 @@ async def get_book_info(book_id: int) -> Optional[dict]:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Catalog service error"
             )
-    except requests.RequestException:
+    except httpx.RequestError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Catalog service unavailable"
+        )
+
+async def _get_books_batch(book_ids: List[int]) -> List[Optional[dict]]:
+    """Look up one batch of books with the catalog's batch endpoint."""
+    try:
+        response = await _send(catalog_client, catalog_breaker, "GET", "/books/batch", params={"ids": book_ids})
+        if response.status_code == 200:
+            return response.json()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Catalog service error"
+        )
+    except httpx.RequestError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Catalog service unavailable"
         )
 
+# Catalog fetches in flight, by book ID, shared by every request
+_inflight_books: Dict[int, asyncio.Future] = {}
+
+async def _fetch_books(book_ids: List[int]) -> Dict[int, Optional[dict]]:
+    """Fetch books from the catalog in batches, caching the ones found."""
+    try:
+        batches = [book_ids[i:i + BOOK_BATCH_SIZE] for i in range(0, len(book_ids), BOOK_BATCH_SIZE)]
+        results = await asyncio.gather(*(_get_books_batch(batch) for batch in batches))
+        books = {}
+        for batch, batch_books in zip(batches, results):
+            for book_id, book in zip(batch, batch_books):
+                books[book_id] = book
+                if book is not None:
+                    _book_cache[book_id] = book
+        return books
+    finally:
+        for book_id in book_ids:
+            _inflight_books.pop(book_id, None)
+
+async def get_books_info(book_ids: List[int]) -> Dict[int, Optional[dict]]:
+    """
+    Get book information for several books, keyed by book ID (None when not found).
+    
+    Books seen in the last BOOK_CACHE_TTL seconds are served from memory.
+    Books another request is already fetching wait on that fetch, so a burst
+    of orders for the same book makes one catalog call; only the rest are
+    fetched here.
+    """
+    books = {book_id: _book_cache[book_id] for book_id in book_ids if book_id in _book_cache}
+    fetches = {}
+    missing = []
+    for book_id in book_ids:
+        if book_id in books or book_id in fetches or book_id in missing:
+            continue
+        if book_id in _inflight_books:
+            fetches[book_id] = _inflight_books[book_id]
+        else:
+            missing.append(book_id)
+    
+    if missing:
+        fetch = asyncio.ensure_future(_fetch_books(missing))
+        for book_id in missing:
+            _inflight_books[book_id] = fetches[book_id] = fetch
+    
+    for book_id, fetch in fetches.items():
+        # Shielded so one caller going away does not cancel the fetch for the others
+        books[book_id] = (await asyncio.shield(fetch))[book_id]
+    return books
+
+class BookLoader:
+    """
+    Per-request batching front for catalog book lookups.
+    
+    load() calls made in the same event-loop tick are collected into one
+    fetch, and each book ID is fetched at most once per loader.
+    """
+    
+    def __init__(self, fetch: Callable[[List[int]], Awaitable[Dict[int, Optional[dict]]]] = get_books_info):
+        self._fetch = fetch
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._pending: List[int] = []
+    
+    async def load(self, book_id: int) -> Optional[dict]:
+        """Get book information for one book, batched with concurrent loads."""
+        future = self._futures.get(book_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[book_id] = loop.create_future()
+            self._pending.append(book_id)
+            if len(self._pending) == 1:
+                loop.call_soon(self._dispatch)
+        return await future
+    
+    async def load_many(self, book_ids: List[int]) -> List[Optional[dict]]:
+        """Get book information for several books, in the order given."""
+        return list(await asyncio.gather(*(self.load(book_id) for book_id in book_ids)))
+    
+    def _dispatch(self):
+        book_ids, self._pending = self._pending, []
+        asyncio.ensure_future(self._resolve(book_ids))
+    
+    async def _resolve(self, book_ids: List[int]):
+        try:
+            books = await self._fetch(book_ids)
+        except Exception as e:
+            # Let a later load() retry instead of caching the failure
+            for book_id in book_ids:
+                self._futures.pop(book_id).set_exception(e)
+            return
+        
+        for book_id in book_ids:
+            self._futures[book_id].set_result(books.get(book_id))
+
+async def get_book_loader() -> BookLoader:
+    """Provide a fresh book loader for each request."""
+    return BookLoader()
+
 async def update_catalog_stock(book_id: int, quantity_change: int, reason: str = "Order processing") -> bool:
     """Update book stock in catalog service."""
     try:
@@ -81,17 +363,25 @@ async def update_catalog_stock(book_id: int, quantity_change: int, reason: str =
             "reason": reason
         }
         
-        response = requests.put(
-            f"{CATALOG_SERVICE_URL}/books/{book_id}/stock", 
+        # Not idempotent, so never retried
+        response = await _send(
+            catalog_client,
+            catalog_breaker,
+            "PUT",
+            f"/books/{book_id}/stock",
+            attempts=1,
             json=payload,
             headers=headers,
             timeout=10
         )
         
         return response.status_code == 200
-    except requests.RequestException as e:
+    except httpx.RequestError as e:
         print(f"Failed to update catalog stock: {e}")
         return False
+    finally:
+        # The cached copy no longer reflects stock
+        _book_cache.pop(book_id, None)
 
 # Optional: For testing without external services
 async def get_mock_user() -> dict:
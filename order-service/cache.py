@@ -0,0 +1,94 @@
+"""
+Cache for order aggregates that are read far more often than they change.
+Uses Redis when REDIS_URL is set so every replica sees the same entries (and
+the same invalidations), and an in-process TTL cache otherwise.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cachetools import TTLCache
+import orjson
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+class ResponseCache:
+    """JSON value cache with a fixed TTL, single-flight population and explicit invalidation."""
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 60, maxsize: int = 10000):
+        self.redis = redis.from_url(redis_url) if redis_url else None
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def close(self):
+        """Close the Redis connection pool, if any."""
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def _read(self, key: str) -> Optional[Any]:
+        if self.redis is None:
+            return self._local.get(key)
+
+        try:
+            raw = await self.redis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache read failed for '{key}': {str(e)}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    async def _write(self, key: str, value: Any):
+        if self.redis is None:
+            self._local[key] = value
+            return
+
+        try:
+            await self.redis.setex(key, self.ttl, orjson.dumps(value))
+        except redis.RedisError as e:
+            logger.warning(f"Cache write failed for '{key}': {str(e)}")
+
+    async def delete(self, *keys: str):
+        """Drop entries so the next read recomputes them."""
+        if self.redis is None:
+            for key in keys:
+                self._local.pop(key, None)
+            return
+
+        try:
+            await self.redis.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning(f"Cache delete failed for {keys}: {str(e)}")
+
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        Concurrent misses for the same key wait on a single factory call
+        instead of each recomputing the value.
+        """
+        value = await self._read(key)
+        if value is not None:
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                value = await self._read(key)
+                if value is None:
+                    value = await factory()
+                    await self._write(key, value)
+                return value
+        finally:
+            if not lock.locked():
+                self._locks.pop(key, None)
+
+# Seconds an order summary is served from cache; writes invalidate it sooner
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "60"))
+
+# Global instance
+summary_cache = ResponseCache(REDIS_URL, ttl=SUMMARY_CACHE_TTL)
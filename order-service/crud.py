@@ -1,47 +1,93 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, desc, func, select, tuple_
+from sqlalchemy.sql import Select
 from database import Order, OrderType, OrderStatus
+from cache import summary_cache
 import schemas
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 import asyncio
 
-def get_order_by_id(db: Session, order_id: int, user_id: int = None) -> Optional[Order]:
+async def _count(db: AsyncSession, query: Select) -> int:
+    """Count the rows a query would return."""
+    return (await db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+
+async def get_order_by_id(db: AsyncSession, order_id: int, user_id: int = None) -> Optional[Order]:
     """Get order by ID, optionally filtered by user."""
-    query = db.query(Order).filter(Order.id == order_id)
+    query = select(Order).where(Order.id == order_id)
     if user_id is not None:
-        query = query.filter(Order.user_id == user_id)
-    return query.first()
+        query = query.where(Order.user_id == user_id)
+    return (await db.execute(query.limit(1))).scalars().first()
+
+ADMIN_SUMMARY_KEY = "summary:admin"
+
+def user_summary_key(user_id: int) -> str:
+    return f"summary:user:{user_id}"
+
+async def invalidate_summaries(user_id: int):
+    """Drop the cached summaries an order change for this user makes stale."""
+    await summary_cache.delete(user_summary_key(user_id), ADMIN_SUMMARY_KEY)
+
+OrderCursor = Tuple[datetime, int]
+
+def encode_cursor(order: Order) -> str:
+    """Build the opaque keyset cursor that points just past an order."""
+    return f"{order.created_at.isoformat()}_{order.id}"
+
+def decode_cursor(cursor: str) -> OrderCursor:
+    """Parse a cursor from encode_cursor(); raises ValueError if malformed."""
+    created_at, order_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(created_at), int(order_id)
 
-def get_user_orders(
-    db: Session,
+async def _paginate(
+    db: AsyncSession, query: Select, skip: int, limit: int, cursor: Optional[OrderCursor]
+) -> Tuple[List[Order], Optional[int]]:
+    """
+    Fetch one page of orders, newest first, with the total match count.
+    
+    With a cursor the page starts right after the (created_at, id) it
+    names, so the database seeks into the index instead of reading and
+    discarding skip rows. Cursor pages return None for the total: counting
+    would scan every match again on each page, so clients keep the total
+    from the first (offset) page, which gets it from a count(*) OVER ()
+    window in the same query.
+    """
+    ordered = query.order_by(desc(Order.created_at), desc(Order.id))
+    if cursor is not None:
+        page = ordered.where(tuple_(Order.created_at, Order.id) < cursor).limit(limit)
+        return list((await db.execute(page)).scalars()), None
+    
+    page = ordered.add_columns(func.count().over().label("total")).offset(skip).limit(limit)
+    rows = (await db.execute(page)).all()
+    if rows:
+        return [row[0] for row in rows], rows[0].total
+    
+    # Page past the end: fall back to a plain count for the total
+    return [], (await _count(db, query)) if skip else 0
+
+async def get_user_orders(
+    db: AsyncSession,
     user_id: int,
     skip: int = 0,
     limit: int = 100,
     order_type: Optional[OrderType] = None,
-    status: Optional[OrderStatus] = None
-) -> Tuple[List[Order], int]:
+    status: Optional[OrderStatus] = None,
+    cursor: Optional[OrderCursor] = None
+) -> Tuple[List[Order], Optional[int]]:
     """Get user orders with optional filtering and pagination."""
-    query = db.query(Order).filter(Order.user_id == user_id)
+    query = select(Order).where(Order.user_id == user_id)
     
     # Apply filters
     if order_type:
-        query = query.filter(Order.order_type == order_type)
+        query = query.where(Order.order_type == order_type)
     
     if status:
-        query = query.filter(Order.status == status)
-    
-    # Get total count before pagination
-    total = query.count()
-    
-    # Apply pagination and ordering
-    orders = query.order_by(desc(Order.created_at)).offset(skip).limit(limit).all()
+        query = query.where(Order.status == status)
     
-    return orders, total
+    return await _paginate(db, query, skip, limit, cursor)
 
-def create_order(db: Session, order: schemas.OrderCreate, user_id: int, book_info: dict) -> Order:
-    """Create a new order."""
-    
+def _new_order(order: schemas.OrderCreate, user_id: int, book_info: dict) -> Order:
+    """Build an unsaved order, priced from the catalog book details."""
     # Calculate total amount
     if order.order_type == OrderType.BUY:
         unit_price = book_info["price"]
@@ -54,7 +100,7 @@ def create_order(db: Session, order: schemas.OrderCreate, user_id: int, book_inf
         rental_start_date = datetime.utcnow()
         rental_end_date = rental_start_date + timedelta(days=order.rental_days)
     
-    db_order = Order(
+    return Order(
         user_id=user_id,
         book_id=order.book_id,
         order_type=order.order_type,
@@ -78,10 +124,13 @@ def create_order(db: Session, order: schemas.OrderCreate, user_id: int, book_inf
         # Metadata
         notes=order.notes
     )
-    
+
+async def create_order(db: AsyncSession, order: schemas.OrderCreate, user_id: int, book_info: dict) -> Order:
+    """Create a new order."""
+    db_order = _new_order(order, user_id, book_info)
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await invalidate_summaries(user_id)
     
     # Update catalog stock after successful order creation
     try:
@@ -98,13 +147,22 @@ def create_order(db: Session, order: schemas.OrderCreate, user_id: int, book_inf
     
     return db_order
 
-def update_order_status(db: Session, order_id: int, status_update: schemas.OrderStatusUpdate, user_id: int = None) -> Optional[Order]:
-    """Update order status."""
-    query = db.query(Order).filter(Order.id == order_id)
-    if user_id is not None:
-        query = query.filter(Order.user_id == user_id)
+async def create_orders(db: AsyncSession, orders: List[Tuple[schemas.OrderCreate, dict]], user_id: int) -> List[Order]:
+    """
+    Create several orders for one user, each paired with its book details.
     
-    db_order = query.first()
+    The rows go out as one multi-row INSERT in a single commit. Catalog stock
+    is not adjusted, so this is for seeding rather than real purchases.
+    """
+    db_orders = [_new_order(order, user_id, book_info) for order, book_info in orders]
+    db.add_all(db_orders)
+    await db.commit()
+    await invalidate_summaries(user_id)
+    return db_orders
+
+async def update_order_status(db: AsyncSession, order_id: int, status_update: schemas.OrderStatusUpdate, user_id: int = None) -> Optional[Order]:
+    """Update order status."""
+    db_order = await get_order_by_id(db, order_id=order_id, user_id=user_id)
     if not db_order:
         return None
     
@@ -112,20 +170,21 @@ def update_order_status(db: Session, order_id: int, status_update: schemas.Order
     if status_update.notes:
         db_order.notes = status_update.notes
     
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await invalidate_summaries(db_order.user_id)
     return db_order
 
-def return_rental(db: Session, order_id: int, return_request: schemas.OrderReturnRequest, user_id: int) -> Optional[Order]:
+async def return_rental(db: AsyncSession, order_id: int, return_request: schemas.OrderReturnRequest, user_id: int) -> Optional[Order]:
     """Return a rental order."""
-    db_order = db.query(Order).filter(
+    result = await db.execute(select(Order).where(
         and_(
             Order.id == order_id,
             Order.user_id == user_id,
             Order.order_type == OrderType.RENT,
             Order.status.in_([OrderStatus.CONFIRMED, OrderStatus.COMPLETED])
         )
-    ).first()
+    ).limit(1))
+    db_order = result.scalars().first()
     
     if not db_order:
         return None
@@ -135,8 +194,8 @@ def return_rental(db: Session, order_id: int, return_request: schemas.OrderRetur
     if return_request.notes:
         db_order.notes = return_request.notes
     
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await invalidate_summaries(db_order.user_id)
     
     # Restore stock when rental is returned
     try:
@@ -153,96 +212,119 @@ def return_rental(db: Session, order_id: int, return_request: schemas.OrderRetur
     
     return db_order
 
-def get_user_order_summary(db: Session, user_id: int) -> schemas.OrderSummary:
-    """Get order summary for a user."""
-    orders = db.query(Order).filter(Order.user_id == user_id).all()
-    
-    total_orders = len(orders)
-    total_purchases = len([o for o in orders if o.order_type == OrderType.BUY])
-    total_rentals = len([o for o in orders if o.order_type == OrderType.RENT])
-    total_amount_spent = sum(o.total_amount for o in orders if o.status != OrderStatus.CANCELLED)
-    active_rentals = len([
-        o for o in orders 
-        if o.order_type == OrderType.RENT 
-        and o.status in [OrderStatus.CONFIRMED, OrderStatus.COMPLETED]
-        and o.rental_returned_date is None
-    ])
-    
-    return schemas.OrderSummary(
-        total_orders=total_orders,
-        total_purchases=total_purchases,
-        total_rentals=total_rentals,
-        total_amount_spent=total_amount_spent,
-        active_rentals=active_rentals
+def _is_active_rental():
+    """SQL condition for rentals that are still out."""
+    return and_(
+        Order.order_type == OrderType.RENT,
+        Order.status.in_([OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
+        Order.rental_returned_date.is_(None)
+    )
+
+def _order_totals(*criteria):
+    """
+    Build a one-row aggregate query over the matching orders.
+    
+    Returns (total_orders, total_purchases, total_rentals, total_amount,
+    active_rentals), computed by the database instead of loading every order.
+    """
+    return select(
+        func.count(Order.id),
+        func.coalesce(func.sum(case((Order.order_type == OrderType.BUY, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Order.order_type == OrderType.RENT, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Order.status != OrderStatus.CANCELLED, Order.total_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((_is_active_rental(), 1), else_=0)), 0)
+    ).where(*criteria)
+
+async def _query_user_order_summary(db: AsyncSession, user_id: int) -> dict:
+    total_orders, total_purchases, total_rentals, total_amount_spent, active_rentals = (await db.execute(
+        _order_totals(Order.user_id == user_id)
+    )).one()
+    
+    return {
+        "total_orders": total_orders,
+        "total_purchases": total_purchases,
+        "total_rentals": total_rentals,
+        "total_amount_spent": total_amount_spent,
+        "active_rentals": active_rentals
+    }
+
+async def get_user_order_summary(db: AsyncSession, user_id: int) -> schemas.OrderSummary:
+    """Get order summary for a user (cached until the user's orders change)."""
+    summary = await summary_cache.get_or_set(
+        user_summary_key(user_id), lambda: _query_user_order_summary(db, user_id)
     )
+    return schemas.OrderSummary(**summary)
 
-def get_active_rentals(db: Session, user_id: int) -> List[Order]:
+async def get_active_rentals(db: AsyncSession, user_id: int) -> List[Order]:
     """Get active rental orders for a user."""
-    return db.query(Order).filter(
-        and_(
-            Order.user_id == user_id,
-            Order.order_type == OrderType.RENT,
-            Order.status.in_([OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-            Order.rental_returned_date.is_(None)
-        )
-    ).order_by(Order.rental_end_date).all()
+    result = await db.execute(
+        select(Order).where(Order.user_id == user_id, _is_active_rental()).order_by(Order.rental_end_date)
+    )
+    return list(result.scalars())
+
+def _is_overdue_rental():
+    """SQL condition for rentals that are still out past their end date."""
+    return and_(_is_active_rental(), Order.rental_end_date < datetime.utcnow())
 
-def get_overdue_rentals(db: Session, user_id: int = None) -> List[Order]:
+async def get_overdue_rentals(db: AsyncSession, user_id: int = None) -> List[Order]:
     """Get overdue rental orders."""
-    query = db.query(Order).filter(
-        and_(
-            Order.order_type == OrderType.RENT,
-            Order.status.in_([OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-            Order.rental_returned_date.is_(None),
-            Order.rental_end_date < datetime.utcnow()
-        )
-    )
+    query = select(Order).where(_is_overdue_rental())
     
     if user_id is not None:
-        query = query.filter(Order.user_id == user_id)
+        query = query.where(Order.user_id == user_id)
     
-    return query.order_by(Order.rental_end_date).all()
+    result = await db.execute(query.order_by(Order.rental_end_date))
+    return list(result.scalars())
 
-def get_all_orders(
-    db: Session,
+async def get_all_orders(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
     order_type: Optional[OrderType] = None,
-    status: Optional[OrderStatus] = None
-) -> Tuple[List[Order], int]:
+    status: Optional[OrderStatus] = None,
+    cursor: Optional[OrderCursor] = None
+) -> Tuple[List[Order], Optional[int]]:
     """Get all orders across all users (admin only)."""
-    query = db.query(Order)
+    query = select(Order)
     
     # Apply filters
     if order_type:
-        query = query.filter(Order.order_type == order_type)
+        query = query.where(Order.order_type == order_type)
     
     if status:
-        query = query.filter(Order.status == status)
+        query = query.where(Order.status == status)
     
-    # Get total count before pagination
-    total = query.count()
+    return await _paginate(db, query, skip, limit, cursor)
+
+EXPORT_BATCH_SIZE = 1000
+
+async def stream_all_orders(
+    db: AsyncSession,
+    order_type: Optional[OrderType] = None,
+    status: Optional[OrderStatus] = None
+) -> AsyncIterator[Order]:
+    """
+    Yield every matching order, newest first, without loading them all.
     
-    # Apply pagination and ordering
-    orders = query.order_by(desc(Order.created_at)).offset(skip).limit(limit).all()
+    Rows are fetched from the cursor EXPORT_BATCH_SIZE at a time, so memory
+    stays flat however many orders match.
+    """
+    query = select(Order)
+    if order_type:
+        query = query.where(Order.order_type == order_type)
+    if status:
+        query = query.where(Order.status == status)
     
-    return orders, total
+    query = query.order_by(desc(Order.created_at), desc(Order.id)).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    async for order in await db.stream_scalars(query):
+        yield order
 
-def get_admin_summary(db: Session) -> dict:
-    """Get admin summary with global statistics."""
-    all_orders = db.query(Order).all()
-    
-    total_orders = len(all_orders)
-    total_purchases = len([o for o in all_orders if o.order_type == OrderType.BUY])
-    total_rentals = len([o for o in all_orders if o.order_type == OrderType.RENT])
-    total_revenue = sum(o.total_amount for o in all_orders if o.status != OrderStatus.CANCELLED)
-    active_rentals = len([
-        o for o in all_orders 
-        if o.order_type == OrderType.RENT 
-        and o.status in [OrderStatus.CONFIRMED, OrderStatus.COMPLETED]
-        and o.rental_returned_date is None
-    ])
-    overdue_rentals = len(get_overdue_rentals(db))
+async def _query_admin_summary(db: AsyncSession) -> dict:
+    # One pass over the table, overdue count included
+    overdue_count = func.coalesce(func.sum(case((_is_overdue_rental(), 1), else_=0)), 0)
+    total_orders, total_purchases, total_rentals, total_revenue, active_rentals, overdue_rentals = (await db.execute(
+        _order_totals().add_columns(overdue_count)
+    )).one()
     
     return {
         "total_orders": total_orders,
@@ -252,3 +334,12 @@ def get_admin_summary(db: Session) -> dict:
         "active_rentals": active_rentals,
         "overdue_rentals": overdue_rentals
     }
+
+async def get_admin_summary(db: AsyncSession) -> dict:
+    """
+    Get admin summary with global statistics.
+    
+    Cached until any order changes; the overdue count can lag by up to
+    SUMMARY_CACHE_TTL as rentals pass their end date.
+    """
+    return await summary_cache.get_or_set(ADMIN_SUMMARY_KEY, lambda: _query_admin_summary(db))
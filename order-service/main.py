@@ -1,16 +1,25 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Query, Request
-from fastapi.responses import PlainTextResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+import os
 import uvicorn
 from typing import Optional, List
+from contextlib import asynccontextmanager
 import logging
+import orjson
 import time
-import requests
 
 # Import our modules
-from database import get_db, OrderType, OrderStatus
-from auth import get_current_user, get_book_info, get_admin_user
+from database import AsyncSessionLocal, get_db, init_db, prewarm_pool, pool_stats, OrderType, OrderStatus
+from auth import BookLoader, get_current_user, get_book_loader, get_admin_user
+import auth
+from cache import summary_cache
 import crud
 import schemas
 from metrics import PrometheusMetrics
@@ -25,10 +34,23 @@ logger = logging.getLogger("order-service")
 # Initialize Prometheus metrics
 metrics = PrometheusMetrics(app_name="order")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and warm the connection pool on startup; release shared HTTP clients on shutdown."""
+    if os.getenv("AUTO_CREATE_TABLES", "1") == "1":
+        await init_db()
+    await prewarm_pool()
+    yield
+    await auth.user_client.aclose()
+    await auth.catalog_client.aclose()
+    await summary_cache.close()
+
 app = FastAPI(
     title="Order Service", 
     version="3.0.0", 
-    description="Order processing service for book purchases and rentals"
+    description="Order processing service for book purchases and rentals",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -40,80 +62,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    """Collect metrics for all requests."""
-    start_time = metrics.start_request()
-    
-    response = await call_next(request)
-    
-    # Calculate processing time
-    process_time = time.time() - start_time
-    metrics.end_request()
-    
-    # Record metrics
-    endpoint = request.url.path
-    metrics.record_request(request.method, endpoint, response.status_code, process_time)
-    
-    return response
+# Probe and scrape endpoints skip request metrics and logging
+UNINSTRUMENTED_PATHS = frozenset({"/", "/health", "/metrics"})
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all API requests with method, path, user, and response status."""
-    start_time = time.time()
+class MetricsMiddleware:
+    """
+    Collect metrics for and log all API requests with method, path, user, and response status.
     
-    # Extract user info if available
-    user_info = "anonymous"
-    try:
-        if "authorization" in request.headers:
-            auth_header = request.headers["authorization"]
-            if auth_header.startswith("Bearer "):
-                user_info = "authenticated"
-    except Exception:
-        pass
+    A plain ASGI middleware rather than @app.middleware("http"): the status
+    is read from the response start message, so the endpoint runs in the
+    same task without BaseHTTPMiddleware's extra task and body stream.
+    """
     
-    # Process request
-    response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    # Calculate processing time
-    process_time = time.time() - start_time
-    
-    # Log the request
-    logger.info(
-        f"Method: {request.method} | "
-        f"Path: {request.url.path} | "
-        f"User: {user_info} | "
-        f"Status: {response.status_code} | "
-        f"Time: {process_time:.3f}s"
-    )
-    
-    return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in UNINSTRUMENTED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = metrics.start_request()
+        status_code = 500
+        
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Calculate processing time
+            process_time = time.perf_counter() - start_time
+            metrics.end_request()
+            
+            # Record metrics against the route template (e.g. /orders/{order_id})
+            # so label cardinality stays bounded by the number of routes
+            method = scope["method"]
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            metrics.record_request(method, endpoint, status_code, process_time)
+            
+            # Log the request
+            if logger.isEnabledFor(logging.INFO):
+                auth_header = Headers(scope=scope).get("authorization", "")
+                user_info = "authenticated" if auth_header.startswith("Bearer ") else "anonymous"
+                logger.info(
+                    f"Method: {method} | "
+                    f"Path: {scope['path']} | "
+                    f"User: {user_info} | "
+                    f"Status: {status_code} | "
+                    f"Time: {process_time:.3f}s"
+                )
+
+app.add_middleware(MetricsMiddleware)
+
+# Probe responses never change, so their bodies are encoded once
+ROOT_BODY = orjson.dumps({"status": "healthy", "service": "order-service"})
+HEALTH_BODY = orjson.dumps({"status": "OK", "service": "order-service"})
 
 @app.get("/")
 async def health_check():
-    return {"status": "healthy", "service": "order-service"}
+    return Response(ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health():
-    return {"status": "OK", "service": "order-service"}
+    return Response(HEALTH_BODY, media_type="application/json")
 
 @app.get("/metrics")
 async def get_metrics():
     """Expose Prometheus metrics."""
-    return PlainTextResponse(metrics.generate_metrics())
+    metrics.record_pool_stats(pool_stats())
+    return metrics.get_metrics()
 
-@app.post("/orders", response_model=schemas.OrderResponse)
+async def order_create_body(request: Request) -> schemas.OrderCreate:
+    """
+    Parse and validate the POST /orders body in one pass over the raw bytes.
+    
+    Errors are raised as RequestValidationError, so clients get the same
+    422 response as from a declared body parameter.
+    """
+    try:
+        return schemas.ORDER_CREATE_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+# The body is read by order_create_body, so document it by hand (OrderType
+# is already a component via the response models)
+_order_create_schema = schemas.OrderCreate.model_json_schema(ref_template="#/components/schemas/{model}")
+_order_create_schema.pop("$defs", None)
+ORDER_CREATE_OPENAPI = {
+    "requestBody": {"required": True, "content": {"application/json": {"schema": _order_create_schema}}}
+}
+
+@app.post("/orders", response_model=schemas.OrderResponse, openapi_extra=ORDER_CREATE_OPENAPI)
 async def create_order(
-    order: schemas.OrderCreate,
+    order: schemas.OrderCreate = Depends(order_create_body),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    book_loader: BookLoader = Depends(get_book_loader),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new order (buy or rent a book)."""
     # Record order creation metric (commented out due to metrics issues)
     # metrics.orders_created.labels(order_type=order.order_type.value).inc()
     
     # Get book information from catalog service
-    book_info = await get_book_info(order.book_id)
+    book_info = await book_loader.load(order.book_id)
     if not book_info:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -135,52 +193,71 @@ async def create_order(
         )
     
     # Create the order
-    return crud.create_order(
+    return await crud.create_order(
         db=db, 
         order=order, 
         user_id=current_user["id"], 
         book_info=book_info
     )
 
+def parse_cursor(cursor: Optional[str]) -> Optional[crud.OrderCursor]:
+    """Decode a ?cursor= value, rejecting malformed ones with 400."""
+    if cursor is None:
+        return None
+    try:
+        return crud.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def next_cursor(orders: list, size: int) -> Optional[str]:
+    """Cursor for the page after this one, or None on the last page."""
+    return crud.encode_cursor(orders[-1]) if len(orders) == size else None
+
 @app.get("/orders", response_model=schemas.OrderListResponse)
 async def get_user_orders(
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
     order_type: Optional[OrderType] = Query(None, description="Filter by order type"),
     status: Optional[OrderStatus] = Query(None, description="Filter by status"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; overrides page"),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's orders with optional filtering and pagination."""
     skip = (page - 1) * size
     
-    orders, total = crud.get_user_orders(
+    orders, total = await crud.get_user_orders(
         db=db,
         user_id=current_user["id"],
         skip=skip,
         limit=size,
         order_type=order_type,
-        status=status
+        status=status,
+        cursor=parse_cursor(cursor)
     )
     
     return schemas.OrderListResponse(
         orders=orders,
         total=total,
         page=page,
-        size=size
+        size=size,
+        next_cursor=next_cursor(orders, size)
     )
 
 @app.get("/orders/{order_id}", response_model=schemas.OrderResponse)
 async def get_order(
     order_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific order by ID."""
     # Record order view metric (commented out due to metrics issues)
     # metrics.orders_viewed.inc()
     
-    order = crud.get_order_by_id(db, order_id=order_id, user_id=current_user["id"])
+    order = await crud.get_order_by_id(db, order_id=order_id, user_id=current_user["id"])
     if order is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -193,10 +270,10 @@ async def update_order_status(
     order_id: int,
     status_update: schemas.OrderStatusUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update order status."""
-    order = crud.update_order_status(
+    order = await crud.update_order_status(
         db, 
         order_id=order_id, 
         status_update=status_update, 
@@ -214,10 +291,10 @@ async def return_rental(
     order_id: int,
     return_request: schemas.OrderReturnRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Return a rental order."""
-    order = crud.return_rental(
+    order = await crud.return_rental(
         db, 
         order_id=order_id, 
         return_request=return_request, 
@@ -233,86 +310,137 @@ async def return_rental(
 @app.get("/orders/summary/me", response_model=schemas.OrderSummary)
 async def get_my_order_summary(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get order summary for current user."""
-    return crud.get_user_order_summary(db, user_id=current_user["id"])
+    return await crud.get_user_order_summary(db, user_id=current_user["id"])
 
 @app.get("/orders/rentals/active", response_model=List[schemas.OrderResponse])
 async def get_active_rentals(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's active rental orders."""
-    return crud.get_active_rentals(db, user_id=current_user["id"])
+    return await crud.get_active_rentals(db, user_id=current_user["id"])
 
 @app.get("/orders/rentals/overdue", response_model=List[schemas.OrderResponse])
 async def get_overdue_rentals(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's overdue rental orders."""
-    return crud.get_overdue_rentals(db, user_id=current_user["id"])
+    return await crud.get_overdue_rentals(db, user_id=current_user["id"])
 
 # Admin-only endpoints
+# AdminOrderResponse fields read straight off the Order row
+ADMIN_ORDER_COLUMNS = [field for field in schemas.AdminOrderResponse.model_fields if field != "user_email"]
+
+async def to_admin_orders(orders: list, request: Request) -> List[schemas.AdminOrderResponse]:
+    """
+    Convert orders to the admin response format.
+    
+    Emails for every user on the page come from one batched user-service
+    lookup; users it cannot resolve get a placeholder email. Rows are built
+    with model_construct: the columns are already typed by the database, so
+    re-validating every field of every row buys nothing.
+    """
+    user_emails = await auth.get_user_emails(
+        (order.user_id for order in orders), request.headers.get("authorization")
+    )
+    return [
+        schemas.AdminOrderResponse.model_construct(
+            **{field: getattr(order, field) for field in ADMIN_ORDER_COLUMNS},
+            user_email=user_emails.get(order.user_id, f"user_{order.user_id}@senecabooks.local")
+        )
+        for order in orders
+    ]
+
 @app.get("/admin/orders", response_model=schemas.AdminOrderListResponse)
 async def get_all_orders_admin(
+    request: Request,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
     order_type: Optional[OrderType] = Query(None, description="Filter by order type"),
     status: Optional[OrderStatus] = Query(None, description="Filter by status"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; overrides page"),
     admin_user: dict = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all orders across all users (admin only)."""
     skip = (page - 1) * size
     
-    orders, total = crud.get_all_orders(
+    orders, total = await crud.get_all_orders(
         db=db,
         skip=skip,
         limit=size,
         order_type=order_type,
-        status=status
+        status=status,
+        cursor=parse_cursor(cursor)
     )
     
     # Convert to admin response format
-    admin_orders = []
-    for order in orders:
-        order_data = schemas.AdminOrderResponse.model_validate(order)
-        # Set a placeholder email - will be enhanced later
-        order_data.user_email = f"user_{order.user_id}@senecabooks.local"
-        admin_orders.append(order_data)
+    admin_orders = await to_admin_orders(orders, request)
     
     return schemas.AdminOrderListResponse(
         orders=admin_orders,
         total=total,
         page=page,
-        size=size
+        size=size,
+        next_cursor=next_cursor(orders, size)
     )
 
+@app.get("/admin/orders/export")
+async def export_orders_admin(
+    request: Request,
+    order_type: Optional[OrderType] = Query(None, description="Filter by order type"),
+    status: Optional[OrderStatus] = Query(None, description="Filter by status"),
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Export all matching orders as NDJSON, one order per line (admin only).
+    
+    Orders are streamed from the database cursor as they are read, so the
+    response can cover the whole table without building it in memory. The
+    body is sent after this handler returns, so the generator opens its own
+    session rather than borrowing the request's get_db one.
+    """
+    async def ndjson_chunk(batch: list) -> str:
+        return "".join(order_data.model_dump_json() + "\n" for order_data in await to_admin_orders(batch, request))
+    
+    async def order_lines():
+        # Resolve user emails and send lines a batch of orders at a time,
+        # one response chunk per batch rather than per order
+        batch = []
+        async with AsyncSessionLocal() as db:
+            async for order in crud.stream_all_orders(db, order_type=order_type, status=status):
+                batch.append(order)
+                if len(batch) == auth.USER_BATCH_SIZE:
+                    yield await ndjson_chunk(batch)
+                    batch = []
+        if batch:
+            yield await ndjson_chunk(batch)
+    
+    return StreamingResponse(order_lines(), media_type="application/x-ndjson")
+
 @app.get("/admin/summary", response_model=schemas.AdminSummary)
 async def get_admin_summary(
     admin_user: dict = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get admin summary with global statistics."""
-    return crud.get_admin_summary(db)
+    return await crud.get_admin_summary(db)
 
 @app.get("/admin/orders/overdue", response_model=List[schemas.AdminOrderResponse])
 async def get_all_overdue_rentals_admin(
+    request: Request,
     admin_user: dict = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all overdue rental orders (admin only)."""
-    orders = crud.get_overdue_rentals(db)
+    orders = await crud.get_overdue_rentals(db)
     
     # Convert to admin response format
-    admin_orders = []
-    for order in orders:
-        order_data = schemas.AdminOrderResponse.model_validate(order)
-        # Set a placeholder email - will be enhanced later
-        order_data.user_email = f"user_{order.user_id}@senecabooks.local"
-        admin_orders.append(order_data)
+    admin_orders = await to_admin_orders(orders, request)
     
     return admin_orders
 
@@ -320,7 +448,7 @@ async def get_all_overdue_rentals_admin(
 @app.post("/seed-orders")
 async def seed_sample_orders(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create sample orders for testing."""
     sample_orders = [
@@ -339,11 +467,11 @@ async def seed_sample_orders(
         }
     ]
     
-    created_orders = []
-    for order_data in sample_orders:
-        try:
+    orders = [
+        (
+            schemas.OrderCreate(**order_data),
             # Mock book info for development
-            book_info = {
+            {
                 "id": order_data["book_id"],
                 "title": f"Sample Book {order_data['book_id']}",
                 "author": "Sample Author",
@@ -353,17 +481,16 @@ async def seed_sample_orders(
                 "available": True,
                 "stock_quantity": 10
             }
-            
-            order = schemas.OrderCreate(**order_data)
-            created_order = crud.create_order(
-                db=db,
-                order=order,
-                user_id=current_user["id"],
-                book_info=book_info
-            )
-            created_orders.append(created_order)
-        except Exception as e:
-            continue  # Skip if error occurs
+        )
+        for order_data in sample_orders
+    ]
+    
+    try:
+        created_orders = await crud.create_orders(db, orders=orders, user_id=current_user["id"])
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.warning(f"Failed to seed sample orders: {str(e)}")
+        created_orders = []
     
     return {
         "message": f"Created {len(created_orders)} sample orders",
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, computed_field, model_validator
 from datetime import datetime, date
 from typing import Optional, List
 from database import OrderType, OrderStatus
@@ -10,15 +10,17 @@ class OrderCreate(BaseModel):
     rental_days: Optional[int] = Field(None, ge=1, le=365, description="Rental days (1-365, required for rent orders)")
     notes: Optional[str] = Field(None, max_length=500, description="Optional order notes")
 
-    @validator('rental_days', always=True)
-    def validate_rental_days(cls, v, values):
-        order_type = values.get('order_type')
-        if order_type == OrderType.RENT:
-            if v is None or v < 1:
+    @model_validator(mode="after")
+    def validate_rental_days(self):
+        if self.order_type == OrderType.RENT:
+            if self.rental_days is None or self.rental_days < 1:
                 raise ValueError('Rental days are required and must be at least 1 for rent orders')
-        elif order_type == OrderType.BUY and v is not None:
+        elif self.order_type == OrderType.BUY and self.rental_days is not None:
             raise ValueError('Rental days should not be specified for buy orders')
-        return v
+        return self
+
+# Built once at import; POST /orders validates raw request bytes with it
+ORDER_CREATE_ADAPTER = TypeAdapter(OrderCreate)
 
 class OrderResponse(BaseModel):
     id: int
@@ -48,14 +50,16 @@ class OrderResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderListResponse(BaseModel):
     orders: List[OrderResponse]
-    total: int
+    # None on cursor pages: keep the total from the first page
+    total: Optional[int] = None
     page: int
     size: int
+    # Pass back as ?cursor= to fetch the next page by keyset instead of OFFSET
+    next_cursor: Optional[str] = None
 
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
@@ -76,7 +80,7 @@ class AdminOrderResponse(BaseModel):
     """Extended order response with user information for admin views"""
     id: int
     user_id: int
-    user_email: Optional[str] = None  # Will be populated via user service
+    user_email: Optional[str] = None  # Populated via the user service
     book_id: int
     order_type: OrderType
     status: OrderStatus
@@ -90,39 +94,41 @@ class AdminOrderResponse(BaseModel):
     unit_price: float
     quantity: int
     total_amount: float
-    total_price: Optional[float] = None  # Alias for frontend compatibility
     
     # Rental details
     rental_days: Optional[int]
     rental_start_date: Optional[datetime]
     rental_end_date: Optional[datetime]
     rental_returned_date: Optional[datetime]
-    returned_at: Optional[datetime] = None  # Alias for frontend compatibility
     
     # Metadata
     notes: Optional[str]
     created_at: datetime
     updated_at: datetime
     
-    def __init__(self, **data):
-        # Map total_amount to total_price for frontend compatibility
-        if 'total_amount' in data:
-            data['total_price'] = data['total_amount']
-        # Map rental_returned_date to returned_at for frontend compatibility
-        if 'rental_returned_date' in data:
-            data['returned_at'] = data['rental_returned_date']
-        super().__init__(**data)
+    model_config = ConfigDict(from_attributes=True)
+    
+    # Aliases for frontend compatibility
+    @computed_field
+    @property
+    def total_price(self) -> float:
+        return self.total_amount
     
-    class Config:
-        from_attributes = True
+    @computed_field
+    @property
+    def returned_at(self) -> Optional[datetime]:
+        return self.rental_returned_date
 
 class AdminOrderListResponse(BaseModel):
+    """Admin order list with pagination"""
     orders: List[AdminOrderResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     size: int
+    next_cursor: Optional[str] = None
 
 class AdminSummary(BaseModel):
+    """Admin summary statistics"""
     total_orders: int
     total_purchases: int
     total_rentals: int
@@ -140,52 +146,3 @@ class BookInfo(BaseModel):
     rent_price: float
     available: bool
     stock_quantity: int
-
-class AdminOrderResponse(BaseModel):
-    """Admin view of order with user information"""
-    id: int
-    user_id: int
-    user_email: Optional[str] = None  # Will be populated dynamically
-    book_id: int
-    order_type: OrderType
-    status: OrderStatus
-    
-    # Book details
-    book_title: str
-    book_author: str
-    book_isbn: Optional[str]
-    
-    # Pricing
-    unit_price: float
-    quantity: int
-    total_amount: float
-    
-    # Rental details
-    rental_days: Optional[int]
-    rental_start_date: Optional[datetime]
-    rental_end_date: Optional[datetime]
-    rental_returned_date: Optional[datetime]
-    
-    # Metadata
-    notes: Optional[str]
-    created_at: datetime
-    updated_at: datetime
-    
-    class Config:
-        from_attributes = True
-
-class AdminOrderListResponse(BaseModel):
-    """Admin order list with pagination"""
-    orders: List[AdminOrderResponse]
-    total: int
-    page: int
-    size: int
-
-class AdminSummary(BaseModel):
-    """Admin summary statistics"""
-    total_orders: int
-    total_purchases: int
-    total_rentals: int
-    total_revenue: float
-    active_rentals: int
-    overdue_rentals: int
@@ -1,28 +1,79 @@
+import asyncio
+import os
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from unittest.mock import patch, AsyncMock
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from unittest.mock import patch, AsyncMock, MagicMock
+from cache import summary_cache
 from database import Base, get_db, OrderType, OrderStatus
+
+# Tables are created on the test engine below, not by the app lifespan
+os.environ["AUTO_CREATE_TABLES"] = "0"
 from main import app
+import main
 
-# Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_orders.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# In-memory test database; StaticPool hands every session the one connection
+# that holds it
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=StaticPool)
 
-Base.metadata.create_all(bind=engine)
+# Let SQLAlchemy emit BEGIN itself; the driver's implicit transactions would
+# otherwise make the app's savepoint commits permanent
+@event.listens_for(engine.sync_engine, "connect")
+def disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+@event.listens_for(engine.sync_engine, "begin")
+def begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+# Bound to each test's connection by the db_connection fixture; commits
+# release a savepoint of the test's transaction
+TestingSessionLocal = async_sessionmaker(
+    autoflush=False, expire_on_commit=False, join_transaction_mode="create_savepoint"
+)
+
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
-client = TestClient(app)
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """Create the schema once for the whole session."""
+    asyncio.run(create_tables())
+
+@pytest.fixture(autouse=True)
+def db_connection(test_database):
+    """Run each test inside a transaction that is rolled back afterwards."""
+    async def begin():
+        connection = await engine.connect()
+        await connection.begin()
+        return connection
+    
+    async def rollback(connection):
+        await connection.rollback()
+        await connection.close()
+        # Cached summaries may count rows that no longer exist
+        summary_cache._local.clear()
+    
+    connection = asyncio.run(begin())
+    TestingSessionLocal.configure(bind=connection)
+    yield connection
+    asyncio.run(rollback(connection))
+
+@pytest.fixture(scope="session")
+def client():
+    """One client for the whole session, so the app lifespan runs once."""
+    with TestClient(app) as test_client:
+        yield test_client
 
 # Mock user for testing
 def mock_get_current_user():
@@ -41,106 +92,126 @@ async def mock_get_book_info(book_id: int):
         "stock_quantity": 10
     }
 
-@pytest.fixture
+async def mock_get_books_info(book_ids):
+    return {book_id: await mock_get_book_info(book_id) for book_id in book_ids}
+
+def seed_orders(*specs: dict, user_id: int = 1) -> list:
+    """
+    Insert orders (given like POST /orders bodies) with one Core INSERT,
+    priced from the mock book info; returns their IDs in order.
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from database import Order
+    
+    now = datetime.utcnow()
+    rows = []
+    for spec in specs:
+        order_type = OrderType(spec["order_type"])
+        quantity = spec.get("quantity", 1)
+        rental_days = spec.get("rental_days")
+        unit_price = 3.99 if order_type == OrderType.RENT else 29.99
+        rows.append({
+            "user_id": user_id,
+            "book_id": spec["book_id"],
+            "order_type": order_type,
+            "status": OrderStatus.CONFIRMED,
+            "book_title": f"Test Book {spec['book_id']}",
+            "book_author": "Test Author",
+            "unit_price": unit_price,
+            "quantity": quantity,
+            "total_amount": unit_price * (rental_days or 1) * quantity,
+            "rental_days": rental_days,
+            "rental_start_date": now if rental_days else None,
+            "rental_end_date": now + timedelta(days=rental_days) if rental_days else None,
+            "notes": spec.get("notes"),
+        })
+    
+    async def run():
+        async with TestingSessionLocal() as db:
+            order_ids = (await db.scalars(insert(Order).returning(Order.id, sort_by_parameter_order=True), rows)).all()
+            await db.commit()
+            return order_ids
+    
+    return asyncio.run(run())
+
+def mock_get_book_loader():
+    from auth import BookLoader
+    return BookLoader(fetch=mock_get_books_info)
+
+@pytest.fixture(scope="session", autouse=True)
 def auth_override():
-    """Override authentication for testing."""
-    from auth import get_current_user, get_book_info
+    """Override authentication and book lookups for every test."""
+    from auth import get_current_user, get_book_loader
     app.dependency_overrides[get_current_user] = mock_get_current_user
-    app.dependency_overrides[get_book_info] = mock_get_book_info
+    app.dependency_overrides[get_book_loader] = mock_get_book_loader
     yield
     app.dependency_overrides.pop(get_current_user, None)
-    app.dependency_overrides.pop(get_book_info, None)
+    app.dependency_overrides.pop(get_book_loader, None)
 
-def test_health_check():
+def test_health_check(client):
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy", "service": "order-service"}
 
-def test_get_empty_orders(auth_override):
+def test_get_empty_orders(client):
     response = client.get("/orders")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] == 0
     assert data["orders"] == []
 
-def test_create_buy_order(auth_override):
-    order_data = {
-        "book_id": 1,
-        "order_type": "buy",
-        "quantity": 2,
-        "notes": "Test purchase order"
-    }
-    
+@pytest.mark.parametrize("order_data, expected_status, expected", [
+    (
+        {"book_id": 1, "order_type": "buy", "quantity": 2, "notes": "Test purchase order"},
+        200,
+        {"quantity": 2, "total_amount": 59.98, "rental_days": None}  # 29.99 * 2
+    ),
+    (
+        {"book_id": 2, "order_type": "rent", "quantity": 1, "rental_days": 7, "notes": "Test rental order"},
+        200,
+        {"quantity": 1, "total_amount": 27.93, "rental_days": 7}  # 3.99 * 7 * 1
+    ),
+    # Missing rental_days
+    ({"book_id": 3, "order_type": "rent", "quantity": 1}, 422, None),
+    # Should not be specified for buy orders
+    ({"book_id": 4, "order_type": "buy", "quantity": 1, "rental_days": 7}, 422, None),
+], ids=["buy", "rent", "rent-without-rental-days", "buy-with-rental-days"])
+def test_create_order(client, order_data, expected_status, expected):
     response = client.post("/orders", json=order_data)
-    assert response.status_code == 200
-    data = response.json()
-    assert data["book_id"] == 1
-    assert data["order_type"] == "buy"
-    assert data["quantity"] == 2
-    assert data["total_amount"] == 59.98  # 29.99 * 2
-    assert data["rental_days"] is None
-    assert "id" in data
-
-def test_create_rent_order(auth_override):
-    order_data = {
-        "book_id": 2,
-        "order_type": "rent",
-        "quantity": 1,
-        "rental_days": 7,
-        "notes": "Test rental order"
-    }
+    assert response.status_code == expected_status
+    if expected is None:
+        return
     
-    response = client.post("/orders", json=order_data)
-    assert response.status_code == 200
     data = response.json()
-    assert data["book_id"] == 2
-    assert data["order_type"] == "rent"
-    assert data["quantity"] == 1
-    assert data["rental_days"] == 7
-    assert data["total_amount"] == 27.93  # 3.99 * 7 * 1
-    assert data["rental_start_date"] is not None
-    assert data["rental_end_date"] is not None
-
-def test_create_rent_order_without_rental_days(auth_override):
-    order_data = {
-        "book_id": 3,
-        "order_type": "rent",
-        "quantity": 1
-        # Missing rental_days
-    }
-    
-    response = client.post("/orders", json=order_data)
-    assert response.status_code == 422  # Validation error
-
-def test_create_buy_order_with_rental_days(auth_override):
-    order_data = {
-        "book_id": 4,
-        "order_type": "buy",
-        "quantity": 1,
-        "rental_days": 7  # Should not be specified for buy orders
-    }
-    
-    response = client.post("/orders", json=order_data)
-    assert response.status_code == 422  # Validation error
+    assert "id" in data
+    assert data["book_id"] == order_data["book_id"]
+    assert data["order_type"] == order_data["order_type"]
+    assert data["notes"] == order_data["notes"]
+    for field, value in expected.items():
+        assert data[field] == value
+    # Only rentals get a rental period
+    is_rental = order_data["order_type"] == "rent"
+    assert (data["rental_start_date"] is not None) == is_rental
+    assert (data["rental_end_date"] is not None) == is_rental
 
-def test_get_orders_after_creation(auth_override):
+def test_get_orders_after_creation(client):
     # Create a few orders first
     orders_data = [
         {"book_id": 5, "order_type": "buy", "quantity": 1},
         {"book_id": 6, "order_type": "rent", "quantity": 1, "rental_days": 3}
     ]
     
-    for order_data in orders_data:
-        client.post("/orders", json=order_data)
+    seed_orders(*orders_data)
     
     # Get orders
     response = client.get("/orders")
     assert response.status_code == 200
     data = response.json()
-    assert data["total"] >= 2
-    assert len(data["orders"]) >= 2
+    assert data["total"] == 2
+    assert len(data["orders"]) == 2
 
-def test_get_order_by_id(auth_override):
+def test_get_order_by_id(client):
     # Create an order first
     order_data = {
         "book_id": 7,
@@ -148,8 +219,7 @@ def test_get_order_by_id(auth_override):
         "quantity": 1,
         "notes": "Specific test order"
     }
-    create_response = client.post("/orders", json=order_data)
-    order_id = create_response.json()["id"]
+    order_id, = seed_orders(order_data)
     
     # Get the specific order
     response = client.get(f"/orders/{order_id}")
@@ -159,20 +229,19 @@ def test_get_order_by_id(auth_override):
     assert data["id"] == order_id
     assert data["notes"] == "Specific test order"
 
-def test_get_nonexistent_order(auth_override):
+def test_get_nonexistent_order(client):
     response = client.get("/orders/99999")
     assert response.status_code == 404
     assert "Order not found" in response.json()["detail"]
 
-def test_update_order_status(auth_override):
+def test_update_order_status(client):
     # Create an order first
     order_data = {
         "book_id": 8,
         "order_type": "buy",
         "quantity": 1
     }
-    create_response = client.post("/orders", json=order_data)
-    order_id = create_response.json()["id"]
+    order_id, = seed_orders(order_data)
     
     # Update status
     status_data = {
@@ -185,7 +254,7 @@ def test_update_order_status(auth_override):
     assert data["status"] == "completed"
     assert "completed successfully" in data["notes"]
 
-def test_return_rental(auth_override):
+def test_return_rental(client):
     # Create a rental order first
     order_data = {
         "book_id": 9,
@@ -193,8 +262,7 @@ def test_return_rental(auth_override):
         "quantity": 1,
         "rental_days": 5
     }
-    create_response = client.post("/orders", json=order_data)
-    order_id = create_response.json()["id"]
+    order_id, = seed_orders(order_data)
     
     # Return the rental
     return_data = {
@@ -206,7 +274,7 @@ def test_return_rental(auth_override):
     assert data["status"] == "returned"
     assert data["rental_returned_date"] is not None
 
-def test_get_order_summary(auth_override):
+def test_get_order_summary(client):
     # Create some orders first
     orders_data = [
         {"book_id": 10, "order_type": "buy", "quantity": 1},
@@ -214,41 +282,39 @@ def test_get_order_summary(auth_override):
         {"book_id": 12, "order_type": "buy", "quantity": 2}
     ]
     
-    for order_data in orders_data:
-        client.post("/orders", json=order_data)
+    seed_orders(*orders_data)
     
     response = client.get("/orders/summary/me")
     assert response.status_code == 200
     data = response.json()
-    assert "total_orders" in data
-    assert "total_purchases" in data
-    assert "total_rentals" in data
-    assert "total_amount_spent" in data
-    assert "active_rentals" in data
+    assert data["total_orders"] == 3
+    assert data["total_purchases"] == 2
+    assert data["total_rentals"] == 1
+    assert data["total_amount_spent"] == pytest.approx(29.99 + 3.99 * 7 + 29.99 * 2)
+    assert data["active_rentals"] == 1
 
-def test_filter_orders_by_type(auth_override):
+def test_filter_orders_by_type(client):
     # Create mixed orders
     orders_data = [
         {"book_id": 13, "order_type": "buy", "quantity": 1},
         {"book_id": 14, "order_type": "rent", "quantity": 1, "rental_days": 3}
     ]
     
-    for order_data in orders_data:
-        client.post("/orders", json=order_data)
+    seed_orders(*orders_data)
     
     # Filter by buy orders
     response = client.get("/orders?order_type=buy")
     assert response.status_code == 200
     data = response.json()
-    assert all(order["order_type"] == "buy" for order in data["orders"])
+    assert [order["book_id"] for order in data["orders"]] == [13]
     
     # Filter by rent orders
     response = client.get("/orders?order_type=rent")
     assert response.status_code == 200
     data = response.json()
-    assert all(order["order_type"] == "rent" for order in data["orders"])
+    assert [order["book_id"] for order in data["orders"]] == [14]
 
-def test_get_active_rentals(auth_override):
+def test_get_active_rentals(client):
     # Create a rental order
     order_data = {
         "book_id": 15,
@@ -256,12 +322,311 @@ def test_get_active_rentals(auth_override):
         "quantity": 1,
         "rental_days": 10
     }
-    client.post("/orders", json=order_data)
+    seed_orders(order_data)
     
     response = client.get("/orders/rentals/active")
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
-    # Should have at least one active rental
-    active_rentals = [order for order in data if order["status"] in ["confirmed", "completed"]]
-    assert len(active_rentals) >= 1
+    assert [order["book_id"] for order in data] == [15]
+    assert data[0]["status"] in ["confirmed", "completed"]
+
+def test_order_summary_aggregates():
+    import crud
+    from database import Order
+    
+    async def run():
+        async with TestingSessionLocal() as db:
+            db.add_all([
+                Order(user_id=501, book_id=1, order_type=OrderType.BUY, status=OrderStatus.CONFIRMED,
+                      book_title="A", book_author="X", unit_price=10.0, quantity=2, total_amount=20.0),
+                Order(user_id=501, book_id=2, order_type=OrderType.RENT, status=OrderStatus.CONFIRMED,
+                      book_title="B", book_author="Y", unit_price=2.0, quantity=1, total_amount=14.0, rental_days=7),
+                Order(user_id=501, book_id=3, order_type=OrderType.BUY, status=OrderStatus.CANCELLED,
+                      book_title="C", book_author="Z", unit_price=5.0, quantity=1, total_amount=5.0),
+            ])
+            await db.commit()
+            return await crud.get_user_order_summary(db, user_id=501), await crud.get_user_order_summary(db, user_id=502)
+    
+    summary, empty = asyncio.run(run())
+    assert summary.total_orders == 3
+    assert summary.total_purchases == 2
+    assert summary.total_rentals == 1
+    assert summary.total_amount_spent == 34.0
+    assert summary.active_rentals == 1
+    
+    assert empty.total_orders == 0
+    assert empty.total_amount_spent == 0
+
+def test_admin_summary_counts_overdue_rentals():
+    import crud
+    from datetime import datetime, timedelta
+    from database import Order
+    
+    async def run():
+        async with TestingSessionLocal() as db:
+            before = await crud.get_admin_summary(db)
+            db.add(Order(user_id=503, book_id=4, order_type=OrderType.RENT, status=OrderStatus.CONFIRMED,
+                         book_title="D", book_author="W", unit_price=1.0, quantity=1, total_amount=3.0,
+                         rental_days=3, rental_start_date=datetime.utcnow() - timedelta(days=10),
+                         rental_end_date=datetime.utcnow() - timedelta(days=7)))
+            await db.commit()
+            # Written behind crud's back, so drop the cached summary by hand
+            await crud.invalidate_summaries(503)
+            return before, await crud.get_admin_summary(db), await crud.get_overdue_rentals(db)
+    
+    before, summary, overdue = asyncio.run(run())
+    assert summary["total_orders"] == before["total_orders"] + 1
+    assert summary["overdue_rentals"] == before["overdue_rentals"] + 1
+    assert summary["overdue_rentals"] == len(overdue)
+
+def test_order_summary_is_cached_until_orders_change(client):
+    import crud
+    
+    first = client.get("/orders/summary/me").json()
+    with patch.object(crud, "_query_user_order_summary", AsyncMock()) as query:
+        assert client.get("/orders/summary/me").json() == first
+    query.assert_not_awaited()
+    
+    client.post("/orders", json={"book_id": 51, "order_type": "buy", "quantity": 1})
+    assert client.get("/orders/summary/me").json()["total_orders"] == first["total_orders"] + 1
+
+def test_verify_user_token_is_cached():
+    import httpx
+    from fastapi import Request
+    from fastapi.security import HTTPAuthorizationCredentials
+    import auth
+    
+    user = {"id": 2, "email": "reader@seneca.ca", "full_name": "Reader"}
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="cached-token")
+    mock_get = AsyncMock(return_value=httpx.Response(200, json=user))
+    
+    with patch.object(auth.user_client, "request", mock_get):
+        # Separate requests share the token cache
+        assert asyncio.run(auth.verify_user_token(Request({"type": "http"}), credentials)) == user
+        request = Request({"type": "http"})
+        assert asyncio.run(auth.verify_user_token(request, credentials)) == user
+        
+        # Within one request the user on request.state is reused outright
+        auth._token_cache.clear()
+        assert asyncio.run(auth.verify_user_token(request, credentials)) == user
+    
+    assert mock_get.await_count == 1
+    assert request.state.user == user
+
+def test_book_loader_coalesces_lookups():
+    from auth import BookLoader
+    
+    fetch = AsyncMock(side_effect=mock_get_books_info)
+    
+    async def load():
+        loader = BookLoader(fetch=fetch)
+        first, second, again = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1))
+        many = await loader.load_many([2, 3])
+        return first, again, many
+    
+    first, again, many = asyncio.run(load())
+    
+    # Same-tick loads share one fetch; already-loaded IDs are not fetched again
+    assert [call.args[0] for call in fetch.await_args_list] == [[1, 2], [3]]
+    assert first == again
+    assert [book["id"] for book in many] == [2, 3]
+
+def test_get_books_info_uses_catalog_batches():
+    import httpx
+    import auth
+    
+    async def batch_response(method, url, params):
+        request = httpx.Request("GET", f"{auth.CATALOG_SERVICE_URL}{url}")
+        books = [None if book_id == 7 else {"id": book_id} for book_id in params["ids"]]
+        return httpx.Response(200, json=books, request=request)
+    
+    auth._book_cache.clear()
+    mock_get = AsyncMock(side_effect=batch_response)
+    # Fresh breaker: stock updates from earlier tests fail against the real URL
+    with patch.object(auth.catalog_client, "request", mock_get), \
+            patch.object(auth, "catalog_breaker", auth.CircuitBreaker()):
+        books = asyncio.run(auth.get_books_info(list(range(1, 151))))
+    
+    # 150 IDs go out as two batch requests instead of 150 single lookups
+    assert [len(call.kwargs["params"]["ids"]) for call in mock_get.await_args_list] == [100, 50]
+    assert books[7] is None
+    assert books[150] == {"id": 150}
+    
+    # Found books are cached; unknown IDs are asked for again
+    with patch.object(auth.catalog_client, "request", mock_get), \
+            patch.object(auth, "catalog_breaker", auth.CircuitBreaker()):
+        books = asyncio.run(auth.get_books_info([7, 150]))
+    assert mock_get.await_args_list[-1].kwargs["params"]["ids"] == [7]
+    assert books == {7: None, 150: {"id": 150}}
+    auth._book_cache.clear()
+
+def test_get_books_info_shares_in_flight_fetches():
+    import auth
+    
+    async def slow_batch(book_ids):
+        await asyncio.sleep(0.01)
+        return [{"id": book_id} for book_id in book_ids]
+    
+    async def burst():
+        return await asyncio.gather(*(auth.get_books_info([61, 62]) for _ in range(5)), auth.get_books_info([62, 63]))
+    
+    auth._book_cache.clear()
+    fetch = AsyncMock(side_effect=slow_batch)
+    with patch.object(auth, "_get_books_batch", fetch):
+        results = asyncio.run(burst())
+    
+    # Concurrent requests for the same books wait on one catalog call
+    assert [call.args[0] for call in fetch.await_args_list] == [[61, 62], [63]]
+    assert all(result[62] == {"id": 62} for result in results)
+    assert results[-1][63] == {"id": 63}
+    assert auth._inflight_books == {}
+    auth._book_cache.clear()
+
+def test_orders_keyset_pagination(client):
+    seed_orders(*({"book_id": book_id, "order_type": "buy"} for book_id in (21, 22, 23)))
+    
+    first_page = client.get("/orders?size=2").json()
+    assert len(first_page["orders"]) == 2
+    assert first_page["next_cursor"] is not None
+    
+    second_page = client.get("/orders", params={"size": 2, "cursor": first_page["next_cursor"]}).json()
+    seen = [order["id"] for order in first_page["orders"] + second_page["orders"]]
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == len(seen) == 3
+    assert first_page["total"] == 3
+    # Cursor pages skip the count; the client keeps the first page's total
+    assert second_page["total"] is None
+    
+    past_end = client.get("/orders?page=1000").json()
+    assert past_end["orders"] == []
+    assert past_end["total"] == first_page["total"]
+    
+    response = client.get("/orders?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_catalog_breaker_opens_after_repeated_failures():
+    import httpx
+    import auth
+    from fastapi import HTTPException
+    
+    breaker = auth.CircuitBreaker(fail_max=2, reset_timeout=30)
+    mock_request = AsyncMock(side_effect=httpx.ConnectError("down"))
+    
+    async def call():
+        return await auth._send(auth.catalog_client, breaker, "GET", "/books/1")
+    
+    with patch.object(auth.catalog_client, "request", mock_request), \
+            patch("auth.asyncio.sleep", AsyncMock()):
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                asyncio.run(call())
+        # Each failed call used every retry; the open breaker skips the network
+        assert mock_request.await_count == 2 * auth.MAX_ATTEMPTS
+        with pytest.raises(auth.CircuitOpenError):
+            asyncio.run(call())
+        assert mock_request.await_count == 2 * auth.MAX_ATTEMPTS
+    
+    # get_book_info reports an open breaker as the service being unavailable
+    with patch.object(auth, "catalog_breaker", breaker):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(auth.get_book_info(1))
+    assert exc_info.value.status_code == 503
+
+def test_admin_export_streams_ndjson(client):
+    import json
+    from auth import get_admin_user
+    
+    seed_orders({"book_id": 31, "order_type": "buy"})
+    app.dependency_overrides[get_admin_user] = lambda: {**mock_get_current_user(), "is_admin": True}
+    try:
+        # The export opens its own session instead of going through get_db
+        with patch.object(main, "AsyncSessionLocal", TestingSessionLocal):
+            response = client.get("/admin/orders/export?order_type=buy")
+    finally:
+        app.dependency_overrides.pop(get_admin_user, None)
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert orders and all(order["order_type"] == "buy" for order in orders)
+    assert any(order["book_id"] == 31 for order in orders)
+    assert orders[0]["user_email"] == f"user_{orders[0]['user_id']}@senecabooks.local"
+
+def test_metrics_recorded_per_route_template(client):
+    from prometheus_client import REGISTRY
+    
+    labels = {"method": "GET", "endpoint": "/orders/{order_id}", "status": "404"}
+    before = REGISTRY.get_sample_value("http_requests_total", labels) or 0
+    client.get("/orders/424242")
+    assert REGISTRY.get_sample_value("http_requests_total", labels) == before + 1
+    
+    # Probes and scrapes are not counted
+    client.get("/health")
+    assert REGISTRY.get_sample_value(
+        "http_requests_total", {"method": "GET", "endpoint": "/health", "status": "200"}
+    ) is None
+
+def test_admin_orders_fill_in_user_emails(client):
+    import httpx
+    import auth
+    from auth import get_admin_user
+    
+    async def users_response(method, url, params, headers):
+        assert headers == {"Authorization": "Bearer admin-token"}
+        request = httpx.Request("GET", f"{auth.USER_SERVICE_URL}{url}")
+        users = [{"id": user_id, "email": f"reader{user_id}@example.com"} for user_id in params["ids"]]
+        return httpx.Response(200, json=users, request=request)
+    
+    seed_orders({"book_id": 41, "order_type": "buy"})
+    mock_request = AsyncMock(side_effect=users_response)
+    app.dependency_overrides[get_admin_user] = lambda: {**mock_get_current_user(), "is_admin": True}
+    try:
+        with patch.object(auth.user_client, "request", mock_request), \
+                patch.object(auth, "user_breaker", auth.CircuitBreaker()):
+            response = client.get("/admin/orders", headers={"Authorization": "Bearer admin-token"})
+    finally:
+        app.dependency_overrides.pop(get_admin_user, None)
+    
+    assert response.status_code == 200
+    orders = response.json()["orders"]
+    assert orders and all(order["user_email"] == f"reader{order['user_id']}@example.com" for order in orders)
+    assert all(order["total_price"] == order["total_amount"] for order in orders)
+    # Every user on the page is resolved with a single lookup
+    assert mock_request.await_count == 1
+
+def test_metrics_endpoint_reports_pool_stats(client):
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    import database
+    
+    pool = AsyncAdaptedQueuePool(lambda: None, pool_size=4)
+    with patch.object(database.engine.sync_engine, "pool", pool):
+        response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert 'db_pool_connections{state="size"} 4.0' in response.text
+    assert 'db_pool_connections{state="checked_out"} 0.0' in response.text
+
+def test_prewarm_pool_skips_only_null_pool():
+    from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, StaticPool
+    import database
+    
+    # (pool, connections prewarm_pool(3) should open)
+    cases = [(NullPool(lambda: None), 0), (AsyncAdaptedQueuePool(lambda: None, pool_size=2), 2), (StaticPool(lambda: None), 3)]
+    for pool, expected_connects in cases:
+        engine = MagicMock(pool=pool, connect=AsyncMock())
+        with patch.object(database, "engine", engine):
+            asyncio.run(database.prewarm_pool(3))
+        assert engine.connect.await_count == expected_connects
+
+def test_seed_orders_commits_once(client):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    
+    with patch.object(AsyncSession, "commit", autospec=True, side_effect=AsyncSession.commit) as commit:
+        response = client.post("/seed-orders")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["message"] == "Created 2 sample orders"
+    assert [order["order_type"] for order in data["orders"]] == ["buy", "rent"]
+    assert commit.await_count == 1
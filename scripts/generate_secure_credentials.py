@@ -4,29 +4,38 @@ Secure test credentials configuration for Seneca Book Store
 Generates secure passwords for test accounts.
 """
 
+import itertools
 import secrets
 import string
 import json
 import os
 from pathlib import Path
 
+PASSWORD_CHARACTERS = (string.ascii_letters + string.digits + "!@#$%^&*").encode()
+# Random bytes at or above the largest multiple of the alphabet size are
+# rejected, so byte % len(PASSWORD_CHARACTERS) stays uniform
+ACCEPT_BYTES_BELOW = 256 - 256 % len(PASSWORD_CHARACTERS)
+
 def generate_secure_password(length=12):
     """Generate a secure random password."""
-    characters = string.ascii_letters + string.digits + "!@#$%^&*"
-    return ''.join(secrets.choice(characters) for _ in range(length))
+    password = bytearray()
+    while len(password) < length:
+        # One read from the OS for the whole password; ~82% of bytes are kept
+        for byte in secrets.token_bytes(length - len(password) + 8):
+            if byte < ACCEPT_BYTES_BELOW:
+                password.append(PASSWORD_CHARACTERS[byte % len(PASSWORD_CHARACTERS)])
+                if len(password) == length:
+                    break
+    return password.decode()
+
+def generate_secure_passwords(lengths):
+    """Generate one password per requested length from a single random draw."""
+    characters = generate_secure_password(sum(lengths))
+    ends = list(itertools.accumulate(lengths))
+    return [characters[end - length:end] for length, end in zip(lengths, ends)]
 
 def generate_test_credentials():
     """Generate secure test credentials and save them to a file."""
-    credentials = {
-        "admin": {
-            "email": "admin@senecabooks.com",
-            "password": generate_secure_password(16),
-            "is_admin": True
-        },
-        "test_users": []
-    }
-    
-    # Generate credentials for test users
     test_emails = [
         "john.doe@example.com",
         "jane.smith@example.com", 
@@ -35,12 +44,20 @@ def generate_test_credentials():
         "sarah.brown@example.com"
     ]
     
-    for email in test_emails:
-        credentials["test_users"].append({
-            "email": email,
-            "password": generate_secure_password(12),
-            "is_admin": False
-        })
+    # Admin password first, then one per test user
+    admin_password, *user_passwords = generate_secure_passwords([16] + [12] * len(test_emails))
+    
+    credentials = {
+        "admin": {
+            "email": "admin@senecabooks.com",
+            "password": admin_password,
+            "is_admin": True
+        },
+        "test_users": [
+            {"email": email, "password": password, "is_admin": False}
+            for email, password in zip(test_emails, user_passwords)
+        ]
+    }
     
     # Save credentials to a secure file
     credentials_file = Path(__file__).parent / "test_credentials.json"
@@ -30,6 +30,9 @@ API_BASE_URLS = {
     }
 }
 
+# Books sent per request to the catalog's batch endpoint (its maximum is 500)
+BOOK_BATCH_SIZE = 100
+
 class DataLoader:
     """Comprehensive data loader for Seneca Book Store services with enhanced error handling."""
     
@@ -161,48 +164,34 @@ class DataLoader:
             
             headers = {"Authorization": f"Bearer {self.admin_token}"}
             
-            for i, book in enumerate(books_data, 1):
+            book_fields = [
+                "title", "author", "isbn", "description", "category", "price", "rent_price",
+                "available", "stock_quantity", "publication_year", "publisher", "cover_url",
+                "source", "external_key"
+            ]
+            
+            # One request per batch instead of one per book; the catalog skips
+            # ISBNs it already has
+            for start in range(0, len(books_data), BOOK_BATCH_SIZE):
+                batch = books_data[start:start + BOOK_BATCH_SIZE]
                 try:
-                    book_data = {
-                        "title": book["title"],
-                        "author": book["author"],
-                        "isbn": book["isbn"],
-                        "description": book["description"],
-                        "category": book["category"],
-                        "price": book["price"],
-                        "rent_price": book["rent_price"],
-                        "available": book["available"],
-                        "stock_quantity": book["stock_quantity"],
-                        "publication_year": book["publication_year"],
-                        "publisher": book["publisher"],
-                        "cover_url": book["cover_url"],
-                        "source": book["source"],
-                        "external_key": book["external_key"]
-                    }
-                    
                     response = await client.post(
-                        f"{self.base_urls['catalog']}/books",
-                        json=book_data,
+                        f"{self.base_urls['catalog']}/books/batch",
+                        json=[{field: book[field] for field in book_fields} for book in batch],
                         headers=headers
                     )
                     
                     if response.status_code == 200:
-                        book_info = response.json()
-                        created_books[book["isbn"]] = book_info
-                        
-                        if i % 20 == 0:
-                            print(f"   📊 Processed {i}/{len(books_data)} books")
+                        result = response.json()
+                        for book_info in result["books"]:
+                            created_books[book_info["isbn"]] = book_info
+                        existing_books += len(result["skipped"])
+                        print(f"   📊 Processed {start + len(batch)}/{len(books_data)} books")
                     else:
-                        # Book might already exist
-                        if "already exists" in response.text or response.status_code == 400:
-                            existing_books += 1
-                            if i % 20 == 0:
-                                print(f"   📊 Processed {i}/{len(books_data)} books (some already existed)")
-                        else:
-                            print(f"   ⚠️  Failed to create book {book['title']}: {response.text}")
+                        print(f"   ⚠️  Failed to create books {start + 1}-{start + len(batch)}: {response.text}")
                         
                 except Exception as e:
-                    print(f"   ❌ Error creating book {book['title']}: {str(e)}")
+                    print(f"   ❌ Error creating books {start + 1}-{start + len(batch)}: {str(e)}")
             
             print(f"   ✅ Successfully processed {len(books_data)} books")
             print(f"   🆕 New books created: {len(created_books)}")
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from database import User
 from auth import get_password_hash, verify_password
 import schemas
+from typing import List
 
 def get_user_by_email(db: Session, email: str):
     """Get user by email."""
@@ -11,6 +12,10 @@ def get_user_by_id(db: Session, user_id: int):
     """Get user by ID."""
     return db.query(User).filter(User.id == user_id).first()
 
+def get_users_by_ids(db: Session, user_ids: List[int]) -> List[User]:
+    """Get the users with the given IDs in one query (missing IDs are left out)."""
+    return db.query(User).filter(User.id.in_(set(user_ids))).all()
+
 def create_user(db: Session, user: schemas.UserCreate):
     """Create a new user."""
     hashed_password = get_password_hash(user.password)
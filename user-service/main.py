@@ -1,9 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 import uvicorn
 from datetime import timedelta
+from typing import List, Optional
+import json
 import logging
 import time
 
@@ -43,9 +46,15 @@ async def get_metrics():
     """Prometheus metrics endpoint."""
     return metrics.get_metrics()
 
+# Probe and scrape endpoints skip request metrics and logging
+UNINSTRUMENTED_PATHS = frozenset({"/", "/health", "/metrics"})
+
 @app.middleware("http")
 async def log_and_monitor_requests(request: Request, call_next):
     """Log all API requests and collect Prometheus metrics."""
+    if request.url.path in UNINSTRUMENTED_PATHS:
+        return await call_next(request)
+    
     start_time = metrics.start_request()
     
     # Extract user info if available
@@ -65,7 +74,7 @@ async def log_and_monitor_requests(request: Request, call_next):
     response = await call_next(request)
     
     # Calculate processing time
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     metrics.end_request()
     
     # Record metrics
@@ -102,13 +111,26 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     return user
 
+async def get_admin_user(current_user: schemas.UserResponse = Depends(get_current_user)):
+    """Get current user and verify admin privileges."""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+# Probe responses never change, so their bodies are encoded once
+ROOT_BODY = json.dumps({"status": "healthy", "service": "user-service"}).encode()
+HEALTH_BODY = json.dumps({"status": "OK", "service": "user-service"}).encode()
+
 @app.get("/")
 async def health_check():
-    return {"status": "healthy", "service": "user-service"}
+    return Response(ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health():
-    return {"status": "OK", "service": "user-service"}
+    return Response(HEALTH_BODY, media_type="application/json")
 
 @app.post("/register", response_model=schemas.UserResponse)
 async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -166,5 +188,20 @@ async def validate_token(current_user: schemas.UserResponse = Depends(get_curren
     """Validate token and return user info."""
     return {"valid": True, "user": current_user}
 
+@app.get("/users/batch", response_model=List[Optional[schemas.UserResponse]])
+async def get_users_batch(
+    ids: List[int] = Query(..., min_length=1, max_length=100, description="User IDs to look up"),
+    admin_user: schemas.UserResponse = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get several users by ID in one call (admin only).
+    
+    Results are returned in request order, with null for IDs that do not
+    exist, so other services can resolve a page of user IDs at once.
+    """
+    users = {user.id: user for user in crud.get_users_by_ids(db, user_ids=ids)}
+    return [users.get(user_id) for user_id in ids]
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,6 +1,7 @@
 # Prometheus metrics for FastAPI services
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
 from fastapi import Response
+import os
 import time
 import logging
 
@@ -21,7 +22,8 @@ REQUEST_DURATION = Histogram(
 
 ACTIVE_REQUESTS = Gauge(
     'http_requests_active',
-    'Currently active HTTP requests'
+    'Currently active HTTP requests',
+    multiprocess_mode='livesum'
 )
 
 ERROR_COUNT = Counter(
@@ -65,6 +67,24 @@ ORDERS_VALUE = Counter(
 )
 
 
+# Set when several worker processes share one metrics directory
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def scrape_registry():
+    """
+    Registry to expose on /metrics.
+    
+    With several worker processes, set PROMETHEUS_MULTIPROC_DIR (an empty
+    directory shared by the workers) so a scrape sums every worker's samples
+    instead of reporting whichever worker happened to answer.
+    """
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
 class PrometheusMetrics:
     """Prometheus metrics collection for FastAPI applications."""
     
@@ -82,7 +102,7 @@ class PrometheusMetrics:
     def start_request(self):
         """Mark the start of an HTTP request."""
         ACTIVE_REQUESTS.inc()
-        return time.time()
+        return time.perf_counter()
     
     def end_request(self):
         """Mark the end of an HTTP request."""
@@ -112,7 +132,7 @@ class PrometheusMetrics:
     
     def get_metrics(self):
         """Get Prometheus metrics in the expected format."""
-        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(scrape_registry()), media_type=CONTENT_TYPE_LATEST)
 
 
 # Global metrics instance (will be initialized in each service)
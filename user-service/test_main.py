@@ -108,3 +108,28 @@ def test_get_user_me_invalid_token():
         headers={"Authorization": "Bearer invalid_token"}
     )
     assert response.status_code == 401
+
+def test_get_users_batch():
+    from auth import create_access_token
+    from database import User
+    
+    db = TestingSessionLocal()
+    try:
+        admin = User(email="batch-admin@example.com", hashed_password="x", full_name="Batch Admin", is_admin=True)
+        reader = User(email="batch-reader@example.com", hashed_password="x", full_name="Batch Reader")
+        db.add_all([admin, reader])
+        db.commit()
+        admin_id, reader_id = admin.id, reader.id
+    finally:
+        db.close()
+    
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'batch-admin@example.com'})}"}
+    response = client.get("/users/batch", params={"ids": [reader_id, 99999, admin_id]}, headers=headers)
+    assert response.status_code == 200
+    assert [user and user["email"] for user in response.json()] == [
+        "batch-reader@example.com", None, "batch-admin@example.com"
+    ]
+    
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'batch-reader@example.com'})}"}
+    response = client.get("/users/batch", params={"ids": [admin_id]}, headers=headers)
+    assert response.status_code == 403